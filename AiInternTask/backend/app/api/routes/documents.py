@@ -1,16 +1,20 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status
-from typing import List, Dict, Any
+from datetime import datetime
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query, Response, status
+from typing import List, Dict, Any, Optional
 import logging
-from ...models.document import DocumentResponse
-from ...services.document_service import DocumentService
+from ...models.document import DocumentResponse, DocumentStatusResponse, BatchUploadItem, BatchUploadResponse, IndexStatusResponse
+from ...services.document_service import DocumentService, UploadTooLargeError
+from ...services.ingestion_service import IngestionService
+from ...services.reindex_service import ReindexService
 from ...services.vector_service import VectorService
+from ...config import DOCUMENT_LIST_PAGE_SIZE
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.post("/", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/", response_model=DocumentResponse, status_code=status.HTTP_202_ACCEPTED)
 def upload_document(
     file: UploadFile = File(...),
     title: str = Form(None)
@@ -20,7 +24,9 @@ def upload_document(
         if client is None:
             logger.warning("MongoDB is not available. Document will be processed but not stored in MongoDB.")
 
-        document = DocumentService.create_document(file, title)
+        document, created = DocumentService.register_document(file, title)
+        if created:
+            IngestionService.submit(document)
         return DocumentResponse(
             id=document.id,
             title=document.title,
@@ -33,6 +39,12 @@ def upload_document(
             upload_date=document.metadata.upload_date,
             last_modified=document.metadata.last_modified
         )
+    except UploadTooLargeError as e:
+        logger.warning(f"Rejected upload of {file.filename}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error uploading document: {str(e)}")
         raise HTTPException(
@@ -40,36 +52,112 @@ def upload_document(
             detail=f"Error uploading document: {str(e)}"
         )
 
+@router.post("/batch", response_model=BatchUploadResponse, status_code=status.HTTP_202_ACCEPTED)
+def upload_documents(files: List[UploadFile] = File(...)):
+    try:
+        from ...core.database import client
+        if client is None:
+            logger.warning("MongoDB is not available. Documents will be processed but not stored in MongoDB.")
+
+        saved, rejected = DocumentService.save_batch_uploads(files)
+        registered = DocumentService.register_documents(saved)
+        new_documents = [document for document, created in registered if created]
+        IngestionService.submit_batch(new_documents)
+
+        items = [
+            BatchUploadItem(
+                filename=filename,
+                status="queued" if created else "duplicate",
+                document_id=document.id
+            )
+            for (filename, _, _), (document, created) in zip(saved, registered)
+        ]
+        items.extend(BatchUploadItem(filename=filename, status="rejected", error=error) for filename, error in rejected)
+        return BatchUploadResponse(
+            queued=len(new_documents),
+            duplicates=len(registered) - len(new_documents),
+            rejected=len(rejected),
+            items=items
+        )
+    except Exception as e:
+        logger.error(f"Error uploading documents: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error uploading documents: {str(e)}"
+        )
+
+@router.post("/reindex", response_model=IndexStatusResponse, status_code=status.HTTP_202_ACCEPTED)
+def start_reindex():
+    try:
+        from ...core.database import client
+        if client is None:
+            logger.warning("MongoDB is not available. Cannot reindex documents.")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Database service unavailable"
+            )
+
+        return ReindexService.start()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error starting reindex: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error starting reindex: {str(e)}"
+        )
+
+@router.get("/reindex", response_model=IndexStatusResponse)
+def get_reindex_status():
+    try:
+        return ReindexService.status()
+    except Exception as e:
+        logger.error(f"Error getting reindex status: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting reindex status: {str(e)}"
+        )
+
 @router.get("/", response_model=List[DocumentResponse])
-def get_all_documents():
+async def get_all_documents(
+    response: Response,
+    limit: int = Query(DOCUMENT_LIST_PAGE_SIZE, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort_by: str = Query("upload_date", pattern="^(upload_date|title)$"),
+    sort_order: str = Query("desc", pattern="^(asc|desc)$"),
+    file_type: Optional[str] = None,
+    uploaded_after: Optional[datetime] = None,
+    uploaded_before: Optional[datetime] = None
+):
     try:
         from ...core.database import client
         if client is None:
             logger.warning("MongoDB is not available. Returning empty document list.")
             return []
 
-        documents = DocumentService.get_all_documents()
-        return [
-            DocumentResponse(
-                id=doc.id,
-                title=doc.title,
-                file_type=doc.file_type,
-                original_filename=doc.original_filename,
-                page_count=doc.metadata.page_count,
-                processed=doc.metadata.processed,
-                ocr_processed=doc.metadata.ocr_processed,
-                file_size=doc.metadata.file_size,
-                upload_date=doc.metadata.upload_date,
-                last_modified=doc.metadata.last_modified
-            )
-            for doc in documents
-        ]
+        documents, next_cursor = await DocumentService.alist_documents(
+            limit=limit,
+            cursor=cursor,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            file_type=file_type,
+            uploaded_after=uploaded_after,
+            uploaded_before=uploaded_before
+        )
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return documents
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error getting documents: {str(e)}")
         return []
 
 @router.get("/{document_id}", response_model=DocumentResponse)
-def get_document(document_id: str):
+async def get_document(document_id: str):
     try:
         from ...core.database import client
         if client is None:
@@ -79,7 +167,7 @@ def get_document(document_id: str):
                 detail="Database service unavailable"
             )
 
-        document = DocumentService.get_document(document_id)
+        document = await DocumentService.aget_document(document_id)
         if not document:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -106,6 +194,25 @@ def get_document(document_id: str):
             detail=f"Error getting document: {str(e)}"
         )
 
+@router.get("/{document_id}/status", response_model=DocumentStatusResponse)
+async def get_document_status(document_id: str):
+    try:
+        document_status = await IngestionService.aget_status(document_id)
+        if not document_status:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Document with ID {document_id} not found"
+            )
+        return document_status
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting document status: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error getting document status: {str(e)}"
+        )
+
 @router.post("/{document_id}/rebuild-embeddings", response_model=Dict[str, Any])
 def rebuild_document_embeddings(document_id: str):
     try:
@@ -1,70 +1,29 @@
-from fastapi import APIRouter, HTTPException, status
-from ...models.query import QueryCreate, QueryResponse
+import json
+import uuid
+from typing import Any, Dict, Iterator, List
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from ...models.query import Query, QueryCreate, QueryResponse, QueryStreamCreate, MultiQuerySearch, QuerySearchResult
 from ...services.query_service import QueryService
 from ...services.theme_service import ThemeService
+from ...config import MAX_QUERY_DOCUMENTS, QUERY_SEARCH_MAX_QUERIES
 
 router = APIRouter()
 
 @router.post("/", response_model=QueryResponse, status_code=status.HTTP_201_CREATED)
-def create_query(query_create: QueryCreate):
+async def create_query(query_create: QueryCreate):
     try:
-        query = QueryService.create_query(query_create)
+        query = await QueryService.acreate_query(query_create)
 
-        from ...services.ollama_service import OllamaService
-        if OllamaService.is_available():
-            try:
-                themes = ThemeService.identify_themes(query)
-            except Exception as theme_error:
-                from ...services.theme_service import logger
-                logger.error(f"Error identifying themes: {str(theme_error)}")
-                from ...models.query import ThemeResponse
-                themes = [
-                    ThemeResponse(
-                        theme_name="Theme Identification Error",
-                        description="An error occurred during theme identification.",
-                        document_ids=[],
-                        supporting_evidence=[f"Error details: {str(theme_error)}"]
-                    )
-                ]
-                from ...core.database import queries_collection
-                if queries_collection is not None:
-                    queries_collection.update_one(
-                        {"_id": query.id},
-                        {"$set": {"themes": [theme.model_dump() for theme in themes]}}
-                    )
-        else:
-            from ...models.query import ThemeResponse
-            themes = [
-                ThemeResponse(
-                    theme_name="Theme Identification Unavailable",
-                    description="Theme identification is unavailable because Ollama is not running.",
-                    document_ids=[],
-                    supporting_evidence=["Please make sure Ollama is installed and running to enable theme identification."]
-                )
-            ]
-            from ...core.database import queries_collection
-            if queries_collection is not None:
-                queries_collection.update_one(
-                    {"_id": query.id},
-                    {"$set": {"themes": [theme.model_dump() for theme in themes]}}
-                )
-        try:
-            updated_query = QueryService.get_query(query.id)
-            if updated_query is None:
-                
-                import logging
-                logging.warning(f"Could not retrieve updated query with ID {query.id}, using original query object")
-                updated_query = query
-        except Exception as query_error:
-            import logging
-            logging.error(f"Error retrieving updated query: {str(query_error)}", exc_info=True)
-            updated_query = query
+        themes = await ThemeService.aidentify_themes(query)
         return QueryResponse(
-            id=updated_query.id,
-            query_text=updated_query.text,
-            document_responses=updated_query.document_responses,
-            themes=updated_query.themes or [],
-            created_at=updated_query.created_at
+            id=query.id,
+            query_text=query.text,
+            document_responses=query.document_responses,
+            themes=themes,
+            partial=query.partial,
+            fallback=query.fallback,
+            created_at=query.created_at
         )
     except Exception as e:
         import logging
@@ -74,10 +33,87 @@ def create_query(query_create: QueryCreate):
             detail=f"Error processing query: {str(e)}"
         )
 
+def stream_query_events(query_stream: QueryStreamCreate) -> Iterator[Dict[str, Any]]:
+    query_id = str(uuid.uuid4())
+    try:
+        document_ids, passages_by_document, query_embedding, fallback = QueryService.retrieve_documents(query_stream.text, query_stream)
+        yield {
+            "event": "query",
+            "id": query_id,
+            "query_text": query_stream.text,
+            "document_ids": document_ids,
+            "partial": fallback is not None,
+            "fallback": fallback
+        }
+
+        responses_by_rank = {}
+        for event in QueryService.iter_document_answers(
+            document_ids,
+            query_stream.text,
+            passages_by_document,
+            query_embedding,
+            stream_tokens=query_stream.stream_tokens
+        ):
+            if event["event"] == "token":
+                yield event
+            elif event["response"] is not None:
+                responses_by_rank[event["rank"]] = event["response"]
+                yield {
+                    "event": "document_response",
+                    "rank": event["rank"],
+                    "data": event["response"].model_dump()
+                }
+
+        query = Query(
+            id=query_id,
+            text=query_stream.text,
+            document_responses=[responses_by_rank[rank] for rank in sorted(responses_by_rank)],
+            themes=[],
+            partial=fallback is not None,
+            fallback=fallback
+        )
+        QueryService.save_query(query)
+
+        themes = ThemeService.identify_themes(query)
+        yield {"event": "themes", "data": [theme.model_dump() for theme in themes]}
+        yield {"event": "done", "id": query_id}
+    except Exception as e:
+        import logging
+        logging.error(f"Error streaming query: {str(e)}", exc_info=True)
+        yield {"event": "error", "id": query_id, "detail": f"Error processing query: {str(e)}"}
+
+@router.post("/stream")
+def stream_query(query_stream: QueryStreamCreate, request: Request):
+    events = stream_query_events(query_stream)
+
+    if "text/event-stream" in request.headers.get("accept", ""):
+        body = (f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n" for event in events)
+        return StreamingResponse(body, media_type="text/event-stream")
+
+    body = (json.dumps(event, default=str) + "\n" for event in events)
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+@router.post("/search", response_model=List[QuerySearchResult])
+def search_queries(search: MultiQuerySearch):
+    if not search.queries or len(search.queries) > QUERY_SEARCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Send between 1 and {QUERY_SEARCH_MAX_QUERIES} queries"
+        )
+    try:
+        return QueryService.search_queries(search.queries, search.max_documents or MAX_QUERY_DOCUMENTS, search)
+    except Exception as e:
+        import logging
+        logging.error(f"Error searching queries: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error searching queries: {str(e)}"
+        )
+
 @router.get("/{query_id}", response_model=QueryResponse)
-def get_query(query_id: str):
+async def get_query(query_id: str):
     try:
-        query = QueryService.get_query(query_id)
+        query = await QueryService.aget_query(query_id)
         if not query:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -88,6 +124,8 @@ def get_query(query_id: str):
             query_text=query.text,
             document_responses=query.document_responses,
             themes=query.themes,
+            partial=query.partial,
+            fallback=query.fallback,
             created_at=query.created_at
         )
     except HTTPException:
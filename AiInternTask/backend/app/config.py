@@ -13,9 +13,87 @@ CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", str(BASE_DIR /
 
 OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://localhost:11434/api")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
+OLLAMA_HEALTH_TTL = float(os.getenv("OLLAMA_HEALTH_TTL", 30))
+OLLAMA_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_FAILURE_THRESHOLD", 3))
+OLLAMA_CIRCUIT_RESET_SECONDS = float(os.getenv("OLLAMA_CIRCUIT_RESET_SECONDS", 30))
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", 20))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 5))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", 30))
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", 2))
+OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", 0.5))
+# Context window requested from Ollama (num_ctx); prompts are packed to fit it with room for the answer
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", 4096))
+ANSWER_MAX_TOKENS = int(os.getenv("ANSWER_MAX_TOKENS", 1024))
+THEMES_MAX_TOKENS = int(os.getenv("THEMES_MAX_TOKENS", 1024))
+# Hugging Face tokenizer matching OLLAMA_MODEL for exact token counts; when empty, tokens are estimated
+OLLAMA_TOKENIZER = os.getenv("OLLAMA_TOKENIZER", "")
+
+# "memory" keeps LLM responses per process, "sqlite" also shares them across workers and restarts
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 20000000))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 86400))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", str(BASE_DIR / "data" / "cache" / "responses.sqlite3"))
+RESPONSE_CACHE_DISK_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_BYTES", 500000000))
+
+OCR_DPI = int(os.getenv("OCR_DPI", 200))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+# Pages with less text than this are OCR'd if images cover at least OCR_MIN_IMAGE_COVERAGE of the page
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", 100))
+OCR_MIN_IMAGE_COVERAGE = float(os.getenv("OCR_MIN_IMAGE_COVERAGE", 0.5))
 
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", str(BASE_DIR / "data" / "uploads"))
 MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 50000000))
+MAX_BATCH_UPLOAD_SIZE = int(os.getenv("MAX_BATCH_UPLOAD_SIZE", 2000000000))
+# Files accepted by one batch upload, counting the entries of zip archives
+BATCH_UPLOAD_MAX_FILES = int(os.getenv("BATCH_UPLOAD_MAX_FILES", 5000))
+# Zip entries that expand beyond this multiple of their compressed size are treated as zip bombs
+MAX_ZIP_COMPRESSION_RATIO = float(os.getenv("MAX_ZIP_COMPRESSION_RATIO", 100))
+# Documents ingested together; their chunks share embedding batches and bulk writes
+INGESTION_BATCH_DOCUMENTS = int(os.getenv("INGESTION_BATCH_DOCUMENTS", 16))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1048576))
+DOCUMENT_LIST_PAGE_SIZE = int(os.getenv("DOCUMENT_LIST_PAGE_SIZE", 100))
+
+# Load the embedding model in the background at startup instead of on the first request
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() in ("1", "true", "yes")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+# Model for new indexes; the live index keeps the model it was built with until a reindex replaces it
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# Bump to reindex with the same model, e.g. after changing CHUNK_SIZE
+EMBEDDING_INDEX_VERSION = os.getenv("EMBEDDING_INDEX_VERSION", "1")
+REINDEX_BATCH_DOCUMENTS = int(os.getenv("REINDEX_BATCH_DOCUMENTS", 16))
+# A reindex that has not saved a checkpoint for this long is taken over by the next process that starts
+REINDEX_LEASE_SECONDS = float(os.getenv("REINDEX_LEASE_SECONDS", 300))
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", 2))
+# Unfinished ingestion claimed by a process on another host is left alone until its status is this old
+INGESTION_LEASE_SECONDS = float(os.getenv("INGESTION_LEASE_SECONDS", 900))
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 800))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 150))
+
+# "passages" sends each document's retrieved chunks to the LLM, "document" sends the full page text
+QUERY_CONTEXT_MODE = os.getenv("QUERY_CONTEXT_MODE", "passages")
+PASSAGES_PER_DOCUMENT = int(os.getenv("PASSAGES_PER_DOCUMENT", 8))
+# Optional per-document cap on passage tokens; 0 fills whatever the context window leaves
+PASSAGE_TOKEN_BUDGET = int(os.getenv("PASSAGE_TOKEN_BUDGET", 0))
+# "hybrid" fuses BM25 matches from the lexical index with vector hits, "vector" uses vector search only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", 50))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", 60))
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", str(BASE_DIR / "data" / "lexical" / "index.sqlite3"))
+# Chunk hits fetched per query, then grouped into documents scored by "max", "sum" or "mean_top_n"
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", 50))
+DOCUMENT_SCORE_AGGREGATION = os.getenv("DOCUMENT_SCORE_AGGREGATION", "max")
+DOCUMENT_SCORE_TOP_N = int(os.getenv("DOCUMENT_SCORE_TOP_N", 3))
+MIN_SIMILARITY = float(os.getenv("MIN_SIMILARITY", 0.2))
+MAX_QUERY_DOCUMENTS = int(os.getenv("MAX_QUERY_DOCUMENTS", 5))
+# When retrieval finds nothing, answer from at most QUERY_FALLBACK_LIMIT documents ("recent") or none ("none")
+QUERY_FALLBACK = os.getenv("QUERY_FALLBACK", "recent")
+QUERY_FALLBACK_LIMIT = int(os.getenv("QUERY_FALLBACK_LIMIT", 3))
+# Recent query embeddings kept per process, keyed by the whitespace-normalized query text
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 1024))
+# Queries accepted by one multi-query search request
+QUERY_SEARCH_MAX_QUERIES = int(os.getenv("QUERY_SEARCH_MAX_QUERIES", 100))
+QUERY_MAX_CONCURRENCY = int(os.getenv("QUERY_MAX_CONCURRENCY", 4))
+QUERY_DOCUMENT_TIMEOUT = float(os.getenv("QUERY_DOCUMENT_TIMEOUT", 120))
 
 os.makedirs(CHROMA_PERSIST_DIRECTORY, exist_ok=True)
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
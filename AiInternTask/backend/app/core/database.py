@@ -1,30 +1,49 @@
 import pymongo
 import chromadb
+import copy
+import json
 import logging
+import threading
 from chromadb.config import Settings
 import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from ..config import MONGODB_URI, MONGODB_DB, CHROMA_PERSIST_DIRECTORY
+from ..config import MONGODB_URI, MONGODB_DB, CHROMA_PERSIST_DIRECTORY, EMBEDDING_MODEL, EMBEDDING_INDEX_VERSION
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+    MOTOR_AVAILABLE = True
+except ImportError:
+    MOTOR_AVAILABLE = False
+    logger.warning("motor not available. Async MongoDB access will fall back to the sync client.")
+
 # Initialize MongoDB and collections
 client = None
 database = None
 documents_collection = None
 queries_collection = None
+pages_collection = None
+
+# Async (Motor) handles on the same database, used by the async route handlers
+async_client = None
+async_database = None
+async_documents_collection = None
+async_queries_collection = None
+async_pages_collection = None
 
-def initialize_mongodb():
-    global client, database, documents_collection, queries_collection
+def initialize_mongodb(verify: bool = True):
+    global client, database, documents_collection, queries_collection, pages_collection
     try:
         if "<username>" in MONGODB_URI or "<password>" in MONGODB_URI or "<cluster-url>" in MONGODB_URI:
             return False
 
+        # The client connects lazily, so creating it does not block on the network.
         client = pymongo.MongoClient(
             MONGODB_URI,
             serverSelectionTimeoutMS=5000,
@@ -33,28 +52,172 @@ def initialize_mongodb():
             maxPoolSize=100,
             retryWrites=True
         )
-        client.admin.command('ping')
-        logger.info("Connected to MongoDB Atlas successfully")
 
         database = client[MONGODB_DB]
         documents_collection = database.documents
         queries_collection = database.queries
+        pages_collection = database.pages
+        initialize_async_mongodb()
+
+        if verify and not verify_mongodb():
+            reset_mongodb()
+            return False
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to connect to MongoDB Atlas: {str(e)}")
+        return False
+
+def verify_mongodb():
+    if client is None:
+        return False
+    try:
+        client.admin.command('ping')
+        logger.info("Connected to MongoDB Atlas successfully")
+
+        pages_collection.create_index([("document_id", pymongo.ASCENDING), ("page_num", pymongo.ASCENDING)], unique=True)
+        documents_collection.create_index("content_hash", unique=True, sparse=True)
+        documents_collection.create_index([("metadata.upload_date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)])
+        documents_collection.create_index([("file_type", pymongo.ASCENDING), ("metadata.upload_date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)])
+        documents_collection.create_index([("title", pymongo.ASCENDING), ("_id", pymongo.ASCENDING)])
         return True
 
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB Atlas: {str(e)}")
         return False
 
+def initialize_async_mongodb():
+    global async_client, async_database, async_documents_collection, async_queries_collection, async_pages_collection
+    if not MOTOR_AVAILABLE:
+        return False
+    try:
+        # Motor connects lazily, so this does not block or need a running event loop.
+        async_client = AsyncIOMotorClient(
+            MONGODB_URI,
+            serverSelectionTimeoutMS=5000,
+            connectTimeoutMS=10000,
+            socketTimeoutMS=45000,
+            maxPoolSize=100,
+            retryWrites=True
+        )
+        async_database = async_client[MONGODB_DB]
+        async_documents_collection = async_database.documents
+        async_queries_collection = async_database.queries
+        async_pages_collection = async_database.pages
+        return True
+    except Exception as e:
+        logger.error(f"Failed to create async MongoDB client: {str(e)}")
+        return False
+
+def reset_mongodb():
+    global client, database, documents_collection, queries_collection, pages_collection
+    global async_client, async_database, async_documents_collection, async_queries_collection, async_pages_collection
+    close_mongodb()
+    client = database = documents_collection = queries_collection = pages_collection = None
+    async_client = async_database = async_documents_collection = async_queries_collection = async_pages_collection = None
+
+def close_mongodb():
+    if async_client is not None:
+        async_client.close()
+    if client is not None:
+        client.close()
+
 # ChromaDB client
 chroma_client = chromadb.PersistentClient(
     path=CHROMA_PERSIST_DIRECTORY,
     settings=Settings(anonymized_telemetry=False)
 )
 
-document_collection = chroma_client.get_or_create_collection(
-    name="documents",
-    metadata={"hnsw:space": "cosine"}
-)
+DEFAULT_DOCUMENT_COLLECTION = "documents"
+# Vectors stored before the index recorded its model were all built with this one
+LEGACY_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+INDEX_STATE_PATH = os.path.join(CHROMA_PERSIST_DIRECTORY, "index_state.json")
+
+_chroma_collections = {}
+_index_state = None
+_index_state_mtime = None
+_index_state_lock = threading.Lock()
+
+def get_chroma_collection(name: str):
+    collection = _chroma_collections.get(name)
+    if collection is None:
+        collection = chroma_client.get_or_create_collection(
+            name=name,
+            metadata={"hnsw:space": "cosine"}
+        )
+        _chroma_collections[name] = collection
+    return collection
+
+def drop_chroma_collection(name: str):
+    _chroma_collections.pop(name, None)
+    try:
+        chroma_client.delete_collection(name)
+    except Exception as e:
+        logger.warning(f"Could not delete Chroma collection {name}: {str(e)}")
+
+def _initial_index_state():
+    # An empty store can start with the configured model; existing vectors keep the one they were built with.
+    empty = get_chroma_collection(DEFAULT_DOCUMENT_COLLECTION).count() == 0
+    return {
+        "active_collection": DEFAULT_DOCUMENT_COLLECTION,
+        "embedding_model": EMBEDDING_MODEL if empty else LEGACY_EMBEDDING_MODEL,
+        "embedding_version": EMBEDDING_INDEX_VERSION if empty else "1",
+        "reindex": None
+    }
+
+def load_index_state():
+    # The state file names the live collection. It is re-read whenever its mtime
+    # changes, so a swap made by one worker is picked up by the others.
+    global _index_state, _index_state_mtime
+    try:
+        mtime = os.stat(INDEX_STATE_PATH).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+
+    with _index_state_lock:
+        if _index_state is None or mtime != _index_state_mtime:
+            if mtime is None:
+                # Saved right away so the model choice does not change once vectors exist.
+                _write_index_state(_initial_index_state())
+            else:
+                with open(INDEX_STATE_PATH) as state_file:
+                    _index_state = json.load(state_file)
+                _index_state_mtime = mtime
+        return copy.deepcopy(_index_state)
+
+def _write_index_state(state):
+    global _index_state, _index_state_mtime
+    temp_path = f"{INDEX_STATE_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as state_file:
+        json.dump(state, state_file, indent=2)
+    # Renaming over the old file is atomic, so readers see either the old or the new state.
+    os.replace(temp_path, INDEX_STATE_PATH)
+    _index_state = copy.deepcopy(state)
+    _index_state_mtime = os.stat(INDEX_STATE_PATH).st_mtime_ns
+
+def save_index_state(state):
+    with _index_state_lock:
+        _write_index_state(state)
+
+def get_vector_collection():
+    return get_chroma_collection(load_index_state()["active_collection"])
+
+# Services call these instead of importing the collections, so they see None once a
+# failed connection check has reset MongoDB and fall back to their degraded paths.
+def get_documents_collection():
+    return documents_collection
+
+def get_queries_collection():
+    return queries_collection
+
+def get_pages_collection():
+    return pages_collection
+
+def get_async_documents_collection():
+    return async_documents_collection
+
+def get_async_queries_collection():
+    return async_queries_collection
 
 def get_document_by_id(document_id: str):
     if documents_collection is None:
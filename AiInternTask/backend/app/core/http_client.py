@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import threading
+import requests
+from typing import Optional, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..config import (
+    OLLAMA_POOL_SIZE,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT,
+    OLLAMA_MAX_RETRIES,
+    OLLAMA_RETRY_BACKOFF,
+)
+
+logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+    logger.warning("httpx not available. Async Ollama client will be disabled.")
+
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+_session_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_probe_session: Optional[requests.Session] = None
+_async_client = None
+
+def ollama_timeout(read_timeout: Optional[float] = None) -> Tuple[float, float]:
+    return (OLLAMA_CONNECT_TIMEOUT, read_timeout or OLLAMA_READ_TIMEOUT)
+
+def get_ollama_session() -> requests.Session:
+    global _session
+    if _session is not None:
+        return _session
+
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=OLLAMA_MAX_RETRIES,
+                connect=OLLAMA_MAX_RETRIES,
+                read=0,
+                status=OLLAMA_MAX_RETRIES,
+                backoff_factor=OLLAMA_RETRY_BACKOFF,
+                status_forcelist=RETRY_STATUS_CODES,
+                allowed_methods=frozenset(["GET", "POST"]),
+                raise_on_status=False
+            )
+            _session = _build_session(OLLAMA_POOL_SIZE, retry)
+    return _session
+
+def get_ollama_probe_session() -> requests.Session:
+    # Health probes must fail fast so the circuit breaker can open; they never retry.
+    global _probe_session
+    if _probe_session is not None:
+        return _probe_session
+
+    with _session_lock:
+        if _probe_session is None:
+            _probe_session = _build_session(1, 0)
+    return _probe_session
+
+def _build_session(pool_size: int, max_retries) -> requests.Session:
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        max_retries=max_retries
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+def get_ollama_async_client():
+    global _async_client
+    if not HTTPX_AVAILABLE:
+        raise RuntimeError("httpx is not installed. Install it to use the async Ollama client.")
+
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=OLLAMA_POOL_SIZE,
+                max_keepalive_connections=OLLAMA_POOL_SIZE
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=OLLAMA_MAX_RETRIES),
+            headers={"Content-Type": "application/json"}
+        )
+    return _async_client
+
+async def async_post_with_retry(url: str, json_data: dict, read_timeout: Optional[float] = None):
+    client = get_ollama_async_client()
+    timeout = httpx.Timeout(read_timeout or OLLAMA_READ_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT)
+
+    # The transport only retries failed connects, so 5xx responses are retried here.
+    for attempt in range(OLLAMA_MAX_RETRIES + 1):
+        response = await client.post(url, json=json_data, timeout=timeout)
+        if response.status_code not in RETRY_STATUS_CODES or attempt == OLLAMA_MAX_RETRIES:
+            return response
+        delay = OLLAMA_RETRY_BACKOFF * (2 ** attempt)
+        logger.warning(f"Ollama returned {response.status_code}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+def close_http_clients() -> None:
+    global _session, _probe_session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+        if _probe_session is not None:
+            _probe_session.close()
+            _probe_session = None
+
+async def aclose_http_clients() -> None:
+    global _async_client
+    close_http_clients()
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
@@ -1,7 +1,9 @@
 import logging
-from fastapi import FastAPI
+import threading
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .config import MONGODB_URI, OLLAMA_API_URL, OLLAMA_MODEL
+from fastapi.responses import JSONResponse
+from .config import MONGODB_URI, OLLAMA_API_URL, OLLAMA_MODEL, MAX_UPLOAD_SIZE, MAX_BATCH_UPLOAD_SIZE, EMBEDDING_WARMUP
 
 logging.basicConfig(
     level=logging.INFO,
@@ -10,20 +12,43 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Initialize MongoDB
-from .core.database import initialize_mongodb
-mongodb_connected = initialize_mongodb()
+# Room for the multipart boundaries and the title field around the file itself
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# Create the MongoDB clients at import. The connection itself is verified in the
+# background after startup so importing the app stays fast.
+from .core.database import initialize_mongodb, verify_mongodb, reset_mongodb
+mongodb_configured = initialize_mongodb(verify=False)
 
 from .api.routes import documents, queries
+from .services.ollama_service import OllamaService
+from .services.health_service import OllamaHealthService
+from .services.vector_service import VectorService
 
-if not mongodb_connected:
-    logger.warning("MongoDB Atlas connection failed. The application will run with limited functionality.")
+# "pending" until the background startup checks have run
+startup_state = {"mongodb": "pending", "ollama": "pending"}
 
-# Check Ollama availability
-from .services.ollama_service import OllamaService
-if not OllamaService.is_available():
-    logger.warning("Ollama is not available. Make sure Ollama is installed and running.")
-    logger.warning(f"Trying to connect to Ollama at {OLLAMA_API_URL} with model {OLLAMA_MODEL}")
+def check_backends():
+    if mongodb_configured and verify_mongodb():
+        startup_state["mongodb"] = "connected"
+        from .services.ingestion_service import IngestionService
+        from .services.reindex_service import ReindexService
+        IngestionService.resume_pending()
+        ReindexService.resume()
+    else:
+        # Drop the clients so services take their degraded paths instead of waiting
+        # out the server selection timeout on every request.
+        reset_mongodb()
+        startup_state["mongodb"] = "unavailable"
+        logger.warning("MongoDB Atlas connection failed. The application will run with limited functionality.")
+
+    if OllamaService.is_available():
+        startup_state["ollama"] = "available"
+    else:
+        startup_state["ollama"] = "unavailable"
+        logger.warning("Ollama is not available. Make sure Ollama is installed and running.")
+        logger.warning(f"Trying to connect to Ollama at {OLLAMA_API_URL} with model {OLLAMA_MODEL}")
+    OllamaHealthService.start_background_refresh()
 
 app = FastAPI(
     title="Document Research Chatbot",
@@ -31,18 +56,59 @@ app = FastAPI(
     version="1.0.0",
 )
 
+# Refuse oversized uploads from the Content-Length header before the multipart
+# body is spooled; the per-file limit is enforced again while saving. Registered
+# before CORS so the 413 response still carries CORS headers.
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    upload_limits = {
+        "/api/documents": MAX_UPLOAD_SIZE,
+        "/api/documents/batch": MAX_BATCH_UPLOAD_SIZE
+    }
+    max_size = upload_limits.get(request.url.path.rstrip("/"))
+    if request.method == "POST" and max_size is not None:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_size + UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Upload exceeds the maximum size of {max_size} bytes"}
+            )
+    return await call_next(request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, replace with specific origins
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Include routers
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
 app.include_router(queries.router, prefix="/api/queries", tags=["Queries"])
 
+@app.on_event("startup")
+def start_background_initialization():
+    threading.Thread(target=check_backends, name="startup-backends", daemon=True).start()
+    if EMBEDDING_WARMUP:
+        threading.Thread(target=VectorService.warm_up, name="startup-embeddings", daemon=True).start()
+
+@app.on_event("shutdown")
+async def close_clients():
+    from .core.http_client import aclose_http_clients
+    await aclose_http_clients()
+
+@app.on_event("shutdown")
+def close_database_clients():
+    from .core.database import close_mongodb
+    close_mongodb()
+
+@app.on_event("shutdown")
+def stop_ocr_workers():
+    from .services.ocr_service import OCRService
+    OCRService.shutdown_pool()
+
 @app.get("/")
 def root():
     return {"message": "Welcome to the Document Research Chatbot API"}
@@ -61,14 +127,14 @@ def health_check():
         mongodb_status = f"error: {str(e)}"
 
     try:
-        from .core.database import document_collection
-        collection_count = document_collection.count()
+        from .core.database import get_vector_collection
+        collection_count = get_vector_collection().count()
         chroma_status = f"connected (documents: {collection_count})"
     except Exception as e:
         logger.error(f"ChromaDB health check failed: {str(e)}")
         chroma_status = f"error: {str(e)}"
 
-    from .services.ollama_service import OllamaService
+    from .services.ollama_service import RESPONSE_CACHE
     ollama_status = "available" if OllamaService.is_available() else "not available"
 
     return {
@@ -76,9 +142,26 @@ def health_check():
         "mongodb": mongodb_status,
         "chromadb": chroma_status,
         "ollama": ollama_status,
+        "ollama_circuit": OllamaHealthService.status()["circuit"],
+        "response_cache": RESPONSE_CACHE.stats(),
         "version": "1.0.0"
     }
 
+@app.get("/ready")
+def readiness_check():
+    # Unlike /health, this reports not ready until startup checks and the model warm-up finish.
+    model_state = VectorService.model_state()
+    model_ready = model_state in ("loaded", "unavailable", "failed") or (model_state == "not loaded" and not EMBEDDING_WARMUP)
+    ready = model_ready and "pending" not in startup_state.values()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "ready": ready,
+            "embedding_model": model_state,
+            **startup_state
+        }
+    )
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting FastAPI server...")
@@ -0,0 +1,39 @@
+import logging
+import sys
+
+from ..core.database import initialize_mongodb, get_chroma_collection, get_documents_collection
+
+logger = logging.getLogger(__name__)
+
+def main() -> int:
+    if not initialize_mongodb():
+        logger.error("MongoDB connection failed. Cannot backfill vector metadata.")
+        return 1
+
+    from ..services.vector_service import VectorService
+
+    # Vectors embedded before query filters existed lack the file type and upload
+    # date, so filtered searches would skip them until this has been run.
+    updated = 0
+    for index in VectorService.write_indexes():
+        collection = get_chroma_collection(index["collection"])
+        for doc_data in get_documents_collection().find({}, {"file_type": 1, "metadata.upload_date": 1}):
+            document_id = str(doc_data["_id"])
+            try:
+                results = collection.get(where={"document_id": document_id}, include=["metadatas"])
+                if not results["ids"]:
+                    continue
+                document_metadata = VectorService.document_metadata(doc_data["file_type"], doc_data["metadata"]["upload_date"])
+                collection.update(
+                    ids=results["ids"],
+                    metadatas=[{**metadata, **document_metadata} for metadata in results["metadatas"]]
+                )
+                updated += len(results["ids"])
+            except Exception as e:
+                logger.error(f"Error backfilling vector metadata for document {document_id}: {str(e)}")
+
+    logger.info(f"Added file type and upload date metadata to {updated} vectors")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
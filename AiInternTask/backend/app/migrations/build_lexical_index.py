@@ -0,0 +1,49 @@
+import logging
+import sys
+from collections import defaultdict
+
+from ..core.database import get_vector_collection
+from ..services.lexical_service import LexicalIndexService
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+def main() -> int:
+    # Chroma already holds every embedded chunk with its text, position and document
+    # metadata, so the lexical index is rebuilt from it directly and uses the same
+    # embedding ids. Run backfill_vector_metadata first if filters miss older chunks.
+    chunks_by_document = defaultdict(list)
+    vector_collection = get_vector_collection()
+    offset = 0
+    while True:
+        results = vector_collection.get(include=["metadatas", "documents"], limit=BATCH_SIZE, offset=offset)
+        if not results["ids"]:
+            break
+        for embedding_id, metadata, text in zip(results["ids"], results["metadatas"], results["documents"]):
+            document_id = metadata.get("document_id")
+            if not document_id or not text:
+                continue
+            chunks_by_document[document_id].append((embedding_id, {**metadata, "text": text}))
+        offset += len(results["ids"])
+
+    for document_id, entries in chunks_by_document.items():
+        try:
+            LexicalIndexService.index_chunks(
+                document_id,
+                [chunk for _, chunk in entries],
+                embedding_ids=[embedding_id for embedding_id, _ in entries],
+                document_metadata=entries[0][1]
+            )
+        except Exception as e:
+            logger.error(f"Error indexing document {document_id}: {str(e)}")
+
+    # Documents whose embeddings are gone from Chroma are dropped from the keyword index too.
+    for document_id in LexicalIndexService.document_ids() - set(chunks_by_document):
+        LexicalIndexService.delete_document(document_id)
+
+    logger.info(f"Built the lexical index for {len(chunks_by_document)} documents from {offset} stored chunks")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,19 @@
+import logging
+import sys
+
+from ..core.database import initialize_mongodb
+from ..services.page_service import PageService
+
+logger = logging.getLogger(__name__)
+
+def main() -> int:
+    if not initialize_mongodb():
+        logger.error("MongoDB connection failed. Cannot migrate document pages.")
+        return 1
+
+    migrated = PageService.migrate_all()
+    logger.info(f"Moved pages of {migrated} documents to the pages collection")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
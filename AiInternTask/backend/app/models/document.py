@@ -24,10 +24,16 @@ class DocumentBase(BaseModel):
 class DocumentCreate(DocumentBase):
     pass
 
+class OCRError(BaseModel):
+    page_num: int
+    error: str
+
 class DocumentMetadata(BaseModel):
     page_count: int
     processed: bool = False
     ocr_processed: bool = False
+    # Pages whose OCR failed keep their text layer; the failures are recorded here
+    ocr_errors: List[OCRError] = []
     file_size: int
     upload_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     last_modified: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -35,13 +41,15 @@ class DocumentMetadata(BaseModel):
 class DocumentPage(BaseModel):
     page_num: int
     text: str
-    embedding_id: Optional[str] = None
+    # Ids of the Chroma vectors for the chunks cut from this page
+    embedding_ids: List[str] = []
 
 class Document(DocumentBase):
     id: Union[str, PyObjectId] = Field(default_factory=PyObjectId, alias="_id")
     metadata: DocumentMetadata
     pages: List[DocumentPage] = []
     file_path: str
+    content_hash: Optional[str] = None
 
     model_config = {
         "populate_by_name": True,
@@ -62,3 +70,50 @@ class DocumentResponse(BaseModel):
     file_size: int
     upload_date: datetime
     last_modified: datetime
+
+class IngestionStage(BaseModel):
+    name: str
+    status: str = "pending"
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class DocumentStatusResponse(BaseModel):
+    document_id: str
+    status: str
+    current_stage: Optional[str] = None
+    progress: float
+    stages: List[IngestionStage]
+    error: Optional[str] = None
+
+class BatchUploadItem(BaseModel):
+    filename: str
+    status: str
+    document_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    queued: int
+    duplicates: int
+    rejected: int
+    items: List[BatchUploadItem]
+
+class ReindexJob(BaseModel):
+    status: str
+    target_collection: str
+    embedding_model: str
+    embedding_version: str
+    processed_documents: int = 0
+    total_documents: int = 0
+    skipped_documents: List[str] = []
+    checkpoint: Optional[str] = None
+    started_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+class IndexStatusResponse(BaseModel):
+    active_collection: str
+    embedding_model: str
+    embedding_version: str
+    previous_collection: Optional[str] = None
+    reindex: Optional[ReindexJob] = None
@@ -5,9 +5,19 @@ from pydantic import BaseModel, Field
 class QueryBase(BaseModel):
     text: str
 
-class QueryCreate(QueryBase):
+class QueryFilters(BaseModel):
+    # Restrict retrieval to these documents, to one file type, or to an upload date range
+    document_ids: Optional[List[str]] = None
+    file_type: Optional[str] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+class QueryCreate(QueryBase, QueryFilters):
     pass
 
+class QueryStreamCreate(QueryCreate):
+    stream_tokens: bool = False
+
 class DocumentCitation(BaseModel):
     document_id: str
     document_title: str
@@ -22,6 +32,26 @@ class DocumentResponse(BaseModel):
     extracted_answer: str
     citations: List[DocumentCitation]
 
+class MultiQuerySearch(QueryFilters):
+    queries: List[str]
+    max_documents: Optional[int] = None
+
+class SearchPassage(BaseModel):
+    page_number: Optional[int] = None
+    paragraph: Optional[int] = None
+    text: str
+    relevance_score: float
+
+class SearchDocumentResult(BaseModel):
+    document_id: str
+    document_title: str
+    score: float
+    passages: List[SearchPassage]
+
+class QuerySearchResult(BaseModel):
+    query_text: str
+    documents: List[SearchDocumentResult]
+
 class ThemeResponse(BaseModel):
     theme_name: str
     description: str
@@ -33,12 +63,17 @@ class QueryResponse(BaseModel):
     query_text: str
     document_responses: List[DocumentResponse]
     themes: List[ThemeResponse]
+    partial: bool = False
+    fallback: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Query(QueryBase):
     id: str
     document_responses: List[DocumentResponse] = []
     themes: List[ThemeResponse] = []
+    # Set when retrieval found nothing and only a bounded fallback set of documents was answered
+    partial: bool = False
+    fallback: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
     class Config:
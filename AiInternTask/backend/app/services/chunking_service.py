@@ -0,0 +1,85 @@
+import re
+import logging
+from bisect import bisect_right
+from typing import List, Dict, Any, Tuple, Optional
+from ..config import CHUNK_SIZE, CHUNK_OVERLAP
+
+logger = logging.getLogger(__name__)
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+class ChunkingService:
+
+    @staticmethod
+    def paragraph_offsets(text: str) -> List[int]:
+        offsets = [0]
+        for match in PARAGRAPH_BREAK.finditer(text):
+            offsets.append(match.end())
+        return offsets
+
+    @staticmethod
+    def split_text(text: str, chunk_size: int, chunk_overlap: int) -> List[Tuple[int, int]]:
+        spans = []
+        text_length = len(text)
+        start = 0
+
+        while start < text_length:
+            end = min(start + chunk_size, text_length)
+
+            if end < text_length:
+                # Prefer ending on a paragraph break, then on any whitespace,
+                # as long as the chunk stays at least half the target size.
+                lower_bound = start + chunk_size // 2
+                split_at = text.rfind("\n\n", lower_bound, end)
+                if split_at < 0:
+                    split_at = max(text.rfind(" ", lower_bound, end), text.rfind("\n", lower_bound, end))
+                if split_at > start:
+                    end = split_at
+
+            spans.append((start, end))
+            if end >= text_length:
+                break
+
+            next_start = max(end - chunk_overlap, start + 1)
+            if next_start > 0 and not text[next_start - 1].isspace():
+                boundary = re.search(r"\s", text[next_start:end])
+                if boundary:
+                    next_start += boundary.end()
+            while next_start < text_length and text[next_start].isspace():
+                next_start += 1
+            start = next_start
+
+        return spans
+
+    @staticmethod
+    def chunk_pages(
+        pages: List[Dict[str, Any]],
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        chunk_size = chunk_size or CHUNK_SIZE
+        chunk_overlap = CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+        if chunk_overlap >= chunk_size:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+
+        chunks = []
+        for page in pages:
+            text = page["text"] or ""
+            paragraph_offsets = ChunkingService.paragraph_offsets(text)
+
+            for start, end in ChunkingService.split_text(text, chunk_size, chunk_overlap):
+                chunk_text = text[start:end].strip()
+                if not chunk_text:
+                    continue
+                chunks.append({
+                    "page_num": page["page_num"],
+                    "chunk_index": len(chunks),
+                    "paragraph_start": bisect_right(paragraph_offsets, start),
+                    "paragraph_end": bisect_right(paragraph_offsets, max(start, end - 1)),
+                    "char_start": start,
+                    "char_end": end,
+                    "text": chunk_text
+                })
+
+        logger.info(f"Split {len(pages)} pages into {len(chunks)} chunks (size={chunk_size}, overlap={chunk_overlap})")
+        return chunks
@@ -1,63 +1,247 @@
 import os
+import asyncio
+import zipfile
 import uuid
+import hashlib
+import json
+import base64
 import logging
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Tuple, BinaryIO
 from fastapi import UploadFile
-import pypdf
-from ..models.document import Document, DocumentMetadata, DocumentPage
-from ..core.database import documents_collection
-from .ocr_service import OCRService
+import pymongo
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, BulkWriteError
+from ..models.document import Document, DocumentMetadata, DocumentPage, DocumentResponse, OCRError
+from ..core.database import get_documents_collection, get_async_documents_collection
+from .ocr_service import OCRService, OCR_AVAILABLE
+from .extraction_service import extract_pdf_text_layer
+from .chunking_service import ChunkingService
 from .vector_service import VectorService
-from ..config import UPLOAD_FOLDER
+from .lexical_service import LexicalIndexService
+from .page_service import PageService
+from ..config import (
+    UPLOAD_FOLDER,
+    UPLOAD_CHUNK_SIZE,
+    MAX_UPLOAD_SIZE,
+    MAX_BATCH_UPLOAD_SIZE,
+    BATCH_UPLOAD_MAX_FILES,
+    MAX_ZIP_COMPRESSION_RATIO,
+    DOCUMENT_LIST_PAGE_SIZE,
+    OCR_WORKERS,
+)
 
 logger = logging.getLogger(__name__)
 
+PDF_EXTENSIONS = ['.pdf']
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp']
+ARCHIVE_EXTENSIONS = ['.zip']
+
+DUPLICATE_KEY_ERROR = 11000
+
+DOCUMENT_SORT_FIELDS = {
+    "upload_date": "metadata.upload_date",
+    "title": "title"
+}
+
+DOCUMENT_SUMMARY_PROJECTION = {
+    "title": 1,
+    "file_type": 1,
+    "original_filename": 1,
+    "metadata.page_count": 1,
+    "metadata.processed": 1,
+    "metadata.ocr_processed": 1,
+    "metadata.file_size": 1,
+    "metadata.upload_date": 1,
+    "metadata.last_modified": 1
+}
+
+class UploadTooLargeError(ValueError):
+    pass
+
 class DocumentService:
 
     @staticmethod
-    def save_upload_file(file: UploadFile) -> str:
+    def save_upload_file(file: UploadFile, max_size: Optional[int] = None) -> Tuple[str, str]:
+        max_size = max_size or MAX_UPLOAD_SIZE
+        declared_size = getattr(file, "size", None)
+        if declared_size is not None and declared_size > max_size:
+            raise UploadTooLargeError(f"File exceeds the maximum upload size of {max_size} bytes")
+
         file_extension = os.path.splitext(file.filename)[1]
+        return DocumentService.save_stream(file.file, file_extension, max_size)
+
+    @staticmethod
+    def save_stream(stream: BinaryIO, file_extension: str, max_size: Optional[int] = None) -> Tuple[str, str]:
+        max_size = max_size or MAX_UPLOAD_SIZE
         unique_filename = f"{uuid.uuid4()}{file_extension}"
         file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
+        partial_path = f"{file_path}.part"
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "wb") as buffer:
-            content = file.file.read()
-            buffer.write(content)
-        return file_path
+
+        content_hash = hashlib.sha256()
+        bytes_written = 0
+        try:
+            with open(partial_path, "wb") as buffer:
+                while True:
+                    chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    bytes_written += len(chunk)
+                    if bytes_written > max_size:
+                        raise UploadTooLargeError(f"File exceeds the maximum upload size of {max_size} bytes")
+                    content_hash.update(chunk)
+                    buffer.write(chunk)
+            os.replace(partial_path, file_path)
+        except Exception:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+        return file_path, content_hash.hexdigest()
 
     @staticmethod
-    def process_pdf(file_path: str) -> List[Dict[str, Any]]:
+    def save_batch_uploads(files: List[UploadFile]) -> Tuple[List[Tuple[str, str, str]], List[Tuple[str, str]]]:
+        saved = []
+        rejected = []
+        # Bytes written to disk so far; zip entries count at their decompressed size.
+        saved_bytes = 0
+        batch_size_error = f"Batch exceeds the maximum size of {MAX_BATCH_UPLOAD_SIZE} bytes once decompressed"
+
+        def accept(filename: str) -> bool:
+            file_extension = os.path.splitext(filename)[1].lower()
+            if file_extension not in PDF_EXTENSIONS + IMAGE_EXTENSIONS:
+                rejected.append((filename, f"Unsupported file type: {file_extension}"))
+                return False
+            if len(saved) >= BATCH_UPLOAD_MAX_FILES:
+                rejected.append((filename, f"Batch exceeds the maximum of {BATCH_UPLOAD_MAX_FILES} files"))
+                return False
+            return True
+
+        for file in files:
+            if os.path.splitext(file.filename)[1].lower() in ARCHIVE_EXTENSIONS:
+                try:
+                    archive = zipfile.ZipFile(file.file)
+                except zipfile.BadZipFile:
+                    rejected.append((file.filename, "Invalid zip archive"))
+                    continue
+                with archive:
+                    for info in archive.infolist():
+                        filename = os.path.basename(info.filename)
+                        if info.is_dir() or not filename or filename.startswith(".") or info.filename.startswith("__MACOSX/"):
+                            continue
+                        if not accept(info.filename):
+                            continue
+                        if info.file_size > MAX_UPLOAD_SIZE:
+                            rejected.append((info.filename, f"File exceeds the maximum upload size of {MAX_UPLOAD_SIZE} bytes"))
+                            continue
+                        if info.file_size > MAX_ZIP_COMPRESSION_RATIO * max(info.compress_size, 1):
+                            rejected.append((info.filename, f"File expands more than {MAX_ZIP_COMPRESSION_RATIO:g} times when decompressed"))
+                            continue
+                        remaining_bytes = MAX_BATCH_UPLOAD_SIZE - saved_bytes
+                        if remaining_bytes <= 0 or info.file_size > remaining_bytes:
+                            rejected.append((info.filename, batch_size_error))
+                            continue
+                        try:
+                            # Both limits are enforced again while decompressing.
+                            with archive.open(info) as entry:
+                                file_path, content_hash = DocumentService.save_stream(
+                                    entry,
+                                    os.path.splitext(filename)[1].lower(),
+                                    min(MAX_UPLOAD_SIZE, remaining_bytes)
+                                )
+                            saved.append((filename, file_path, content_hash))
+                            saved_bytes += os.path.getsize(file_path)
+                        except UploadTooLargeError as e:
+                            rejected.append((info.filename, batch_size_error if remaining_bytes < MAX_UPLOAD_SIZE else str(e)))
+                        except Exception as e:
+                            rejected.append((info.filename, str(e)))
+                continue
+
+            if not accept(file.filename):
+                continue
+            # Chunked requests carry no Content-Length, so the batch total is enforced here too.
+            remaining_bytes = MAX_BATCH_UPLOAD_SIZE - saved_bytes
+            if remaining_bytes <= 0:
+                rejected.append((file.filename, batch_size_error))
+                continue
+            try:
+                file_path, content_hash = DocumentService.save_upload_file(file, min(MAX_UPLOAD_SIZE, remaining_bytes))
+                saved.append((file.filename, file_path, content_hash))
+                saved_bytes += os.path.getsize(file_path)
+            except UploadTooLargeError as e:
+                rejected.append((file.filename, batch_size_error if remaining_bytes < MAX_UPLOAD_SIZE else str(e)))
+            except Exception as e:
+                rejected.append((file.filename, str(e)))
+
+        return saved, rejected
+
+    @staticmethod
+    def find_by_content_hash(content_hash: str) -> Optional[Document]:
+        if get_documents_collection() is None:
+            return None
         try:
-            with open(file_path, "rb") as f:
-                pdf = pypdf.PdfReader(f)
-                pages = []
-                extracted_text_empty = True
-
-                for i, page in enumerate(pdf.pages):
-                    text = page.extract_text() or ""
-                    if text.strip():
-                        extracted_text_empty = False
-                    pages.append({
-                        "page_num": i + 1,
-                        "text": text or "No text could be extracted from this page."
-                    })
-
-                if extracted_text_empty:
-                    try:
-                        ocr_pages = OCRService.process_pdf(file_path)
-                        if ocr_pages and len(ocr_pages) > 0:
-                            return ocr_pages
-                    except Exception as ocr_error:
-                        logger.warning(f"OCR processing failed, using standard extraction results: {str(ocr_error)}")
-
-                return pages
+            doc_data = get_documents_collection().find_one({"content_hash": content_hash})
+            return Document(**doc_data) if doc_data else None
         except Exception as e:
-            logger.error(f"Error processing PDF: {str(e)}")
-            return [{
-                "page_num": 1,
-                "text": f"Error processing PDF: {str(e)}"
-            }]
+            logger.error(f"Error looking up document by content hash: {str(e)}")
+            return None
+
+    @staticmethod
+    def reuse_existing(existing: Document, file_path: str) -> Tuple[Document, bool]:
+        os.remove(file_path)
+        # Uploading a file again is how a failed ingestion is retried; the claim makes
+        # sure concurrent uploads of the same file queue it only once.
+        if get_documents_collection() is None:
+            return existing, False
+        try:
+            claimed = get_documents_collection().find_one_and_update(
+                {"_id": existing.id, "ingestion.status": "failed"},
+                {"$set": {"ingestion.status": "queued"}},
+                projection={"_id": 1}
+            )
+        except Exception as e:
+            logger.error(f"Error checking ingestion status of document {existing.id}: {str(e)}")
+            return existing, False
+        if claimed:
+            logger.info(f"Retrying failed ingestion of document {existing.id}")
+        return existing, claimed is not None
+
+    @staticmethod
+    def process_pdf(file_path: str) -> List[Dict[str, Any]]:
+        pages = extract_pdf_text_layer(file_path)
+        return DocumentService.ocr_pages(file_path, pages)
+
+    @staticmethod
+    def ocr_pages(file_path: str, pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        page_numbers = [page["page_num"] for page in pages if page.get("needs_ocr")]
+        if not page_numbers:
+            return pages
+        if not OCR_AVAILABLE:
+            logger.warning(f"OCR is not available. Keeping text layer for {len(page_numbers)} pages that need OCR.")
+            return pages
+
+        try:
+            ocr_results = {
+                result["page_num"]: result
+                for result in OCRService.process_pdf(file_path, page_numbers=page_numbers)
+            }
+        except Exception as ocr_error:
+            logger.warning(f"OCR processing failed, using standard extraction results: {str(ocr_error)}")
+            ocr_results = {page_num: {"text": "", "ocr_error": str(ocr_error)} for page_num in page_numbers}
+
+        # A page whose OCR failed keeps its text layer; the error is recorded on the document.
+        for page in pages:
+            result = ocr_results.get(page["page_num"])
+            if not page.get("needs_ocr") or result is None:
+                continue
+            if result.get("ocr_error"):
+                page["ocr_error"] = result["ocr_error"]
+            elif result["text"].strip():
+                page["text"] = result["text"]
+                page["ocr_processed"] = True
+        return pages
 
     @staticmethod
     def process_image(file_path: str) -> List[Dict[str, Any]]:
@@ -65,13 +249,15 @@ class DocumentService:
             text = OCRService.process_image(file_path)
             return [{
                 "page_num": 1,
-                "text": text
+                "text": text,
+                "ocr_processed": True
             }]
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
             return [{
                 "page_num": 1,
-                "text": f"Error processing image: {str(e)}"
+                "text": "",
+                "ocr_error": str(e)
             }]
 
     @staticmethod
@@ -80,98 +266,250 @@ class DocumentService:
         title: str = None
     ) -> Document:
         try:
-            file_path = DocumentService.save_upload_file(file)
-            file_size = os.path.getsize(file_path)
-            filename, file_extension = os.path.splitext(file.filename)
-            file_extension = file_extension.lower()
-            if not title:
-                title = filename
-            pages = []
-            needs_ocr = False
-            if file_extension in ['.pdf']:
-                try:
-                    needs_ocr = OCRService.is_scanned_document(file_path)
-                except Exception as ocr_error:
-                    logger.warning(f"Could not check if document needs OCR: {str(ocr_error)}")
-                    needs_ocr = False
-                pages = DocumentService.process_pdf(file_path)
-            elif file_extension in ['.jpg', '.jpeg', '.png', '.tiff', '.tif', '.bmp']:
-                pages = DocumentService.process_image(file_path)
-                needs_ocr = True
-            else:
-                raise ValueError(f"Unsupported file type: {file_extension}")
-            document_id = str(uuid.uuid4())
-            metadata = DocumentMetadata(
-                page_count=len(pages),
-                processed=True,
-                ocr_processed=needs_ocr,
-                file_size=file_size,
+            document, created = DocumentService.register_document(file, title)
+            if not created:
+                return document
+            return DocumentService.ingest_document(document)
+        except Exception as e:
+            logger.error(f"Error creating document: {str(e)}")
+            raise
+
+    @staticmethod
+    def register_document(
+        file: UploadFile,
+        title: str = None
+    ) -> Tuple[Document, bool]:
+        file_extension = os.path.splitext(file.filename)[1].lower()
+        if file_extension not in PDF_EXTENSIONS + IMAGE_EXTENSIONS:
+            raise ValueError(f"Unsupported file type: {file_extension}")
+
+        file_path, content_hash = DocumentService.save_upload_file(file)
+
+        existing = DocumentService.find_by_content_hash(content_hash)
+        if existing:
+            logger.info(f"Upload of {file.filename} matches existing document {existing.id}, reusing it")
+            return DocumentService.reuse_existing(existing, file_path)
+
+        document = DocumentService.new_document(file.filename, file_path, content_hash, title)
+
+        if get_documents_collection() is None:
+            logger.warning("MongoDB documents collection is not initialized")
+            logger.info("Skipping MongoDB storage since MongoDB is not available")
+        else:
+            try:
+                get_documents_collection().insert_one(document.model_dump(by_alias=True))
+            except DuplicateKeyError:
+                # Another request stored the same file between our lookup and insert.
+                existing = DocumentService.find_by_content_hash(content_hash)
+                if existing:
+                    return DocumentService.reuse_existing(existing, file_path)
+                os.remove(file_path)
+                raise RuntimeError(f"Could not store {file.filename}: a document with the same content exists but could not be read back")
+            except Exception as e:
+                logger.error(f"Error storing document in MongoDB: {str(e)}")
+
+        return document, True
+
+    @staticmethod
+    def new_document(original_filename: str, file_path: str, content_hash: str, title: Optional[str] = None) -> Document:
+        filename, file_extension = os.path.splitext(original_filename)
+        return Document(
+            id=str(uuid.uuid4()),
+            title=title or filename,
+            file_type=file_extension.lower()[1:],
+            original_filename=original_filename,
+            content_hash=content_hash,
+            metadata=DocumentMetadata(
+                page_count=0,
+                processed=False,
+                ocr_processed=False,
+                file_size=os.path.getsize(file_path),
                 upload_date=datetime.now(timezone.utc),
                 last_modified=datetime.now(timezone.utc)
-            )
-            document_pages = []
-            for page in pages:
-                document_pages.append(DocumentPage(
-                    page_num=page["page_num"],
-                    text=page["text"]
-                ))
-            document = Document(
-                id=document_id,
-                title=title,
-                file_type=file_extension[1:],
-                original_filename=file.filename,
-                metadata=metadata,
-                pages=document_pages,
-                file_path=file_path
-            )
+            ),
+            pages=[],
+            file_path=file_path
+        )
 
-            if documents_collection is None:
-                logger.warning("MongoDB documents collection is not initialized")
-                logger.info("Skipping MongoDB storage since MongoDB is not available")
-                logger.info("Document will only be processed for vector embeddings")
+    @staticmethod
+    def register_documents(uploads: List[Tuple[str, str, str]]) -> List[Tuple[Document, bool]]:
+        existing = {}
+        content_hashes = list({content_hash for _, _, content_hash in uploads})
+        if get_documents_collection() is not None and content_hashes:
+            try:
+                for doc_data in get_documents_collection().find({"content_hash": {"$in": content_hashes}}, {"pages": 0}):
+                    existing[doc_data["content_hash"]] = Document(**doc_data)
+            except Exception as e:
+                logger.error(f"Error looking up documents by content hash: {str(e)}")
 
-                try:
-                    for page in document_pages:
-                        embedding_id = VectorService.create_embedding(
-                            document_id=document_id,
-                            page_num=page.page_num,
-                            text=page.text
-                        )
-                        page.embedding_id = embedding_id
-                except Exception as e:
-                    logger.error(f"Error creating embeddings: {str(e)}")
-            else:
-                try:
-                    documents_collection.insert_one(document.model_dump(by_alias=True))
-
-                    for page in document_pages:
-                        embedding_id = VectorService.create_embedding(
-                            document_id=document_id,
-                            page_num=page.page_num,
-                            text=page.text
-                        )
-                        page.embedding_id = embedding_id
-
-                    documents_collection.update_one(
-                        {"_id": document_id},
-                        {"$set": {"pages": [page.model_dump() for page in document_pages]}}
-                    )
-                except Exception as e:
-                    logger.error(f"Error storing document in MongoDB: {str(e)}")
-
-            return document
+        results = []
+        new_documents = []
+        for original_filename, file_path, content_hash in uploads:
+            if content_hash in existing:
+                # Already stored, or repeated earlier in this batch.
+                results.append(DocumentService.reuse_existing(existing[content_hash], file_path))
+                continue
+            document = DocumentService.new_document(original_filename, file_path, content_hash)
+            existing[content_hash] = document
+            new_documents.append((len(results), document))
+            results.append((document, True))
+
+        if get_documents_collection() is None:
+            logger.warning("MongoDB documents collection is not initialized")
+            logger.info("Skipping MongoDB storage since MongoDB is not available")
+        elif new_documents:
+            try:
+                get_documents_collection().insert_many(
+                    [document.model_dump(by_alias=True) for _, document in new_documents],
+                    ordered=False
+                )
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    position, document = new_documents[error["index"]]
+                    if error.get("code") != DUPLICATE_KEY_ERROR:
+                        logger.error(f"Error storing document {document.original_filename} in MongoDB: {error.get('errmsg')}")
+                        continue
+                    # Another request stored the same file between our lookup and insert.
+                    stored = DocumentService.find_by_content_hash(document.content_hash)
+                    if stored:
+                        results[position] = DocumentService.reuse_existing(stored, document.file_path)
+            except Exception as e:
+                logger.error(f"Error storing documents in MongoDB: {str(e)}")
+
+        logger.info(f"Registered {len(new_documents)} new documents from a batch of {len(uploads)} files")
+        return results
+
+    @staticmethod
+    def ingest_document(
+        document: Document,
+        on_stage: Optional[Callable[[str, str], None]] = None
+    ) -> Document:
+        batch_on_stage = None
+        if on_stage:
+            batch_on_stage = lambda document_ids, name, status: on_stage(name, status)
+        return DocumentService.ingest_batch([document], on_stage=batch_on_stage)[0]
+
+    @staticmethod
+    def ingest_batch(
+        documents: List[Document],
+        on_stage: Optional[Callable[[List[str], str, str], None]] = None
+    ) -> List[Document]:
+        def stage(stage_documents: List[Document], name: str, status: str) -> None:
+            if on_stage and stage_documents:
+                on_stage([document.id for document in stage_documents], name, status)
+
+        pdf_documents = [document for document in documents if f".{document.file_type}" in PDF_EXTENSIONS]
+        image_documents = [document for document in documents if f".{document.file_type}" not in PDF_EXTENSIONS]
+        image_ids = {document.id for document in image_documents}
+        pages_by_document = {}
+
+        # Text layers are parsed in the CPU pool so several PDFs are read at once.
+        stage(pdf_documents, "extract", "running")
+        stage(image_documents, "extract", "skipped")
+        pool = OCRService.get_pool()
+        futures = {document.id: pool.submit(extract_pdf_text_layer, document.file_path) for document in pdf_documents}
+        for document in pdf_documents:
+            try:
+                pages_by_document[document.id] = futures[document.id].result()
+            except Exception as e:
+                logger.warning(f"Text extraction worker failed for {document.file_path}, extracting inline: {str(e)}")
+                pages_by_document[document.id] = extract_pdf_text_layer(document.file_path)
+        stage(pdf_documents, "extract", "completed")
+
+        ocr_documents = [
+            document for document in pdf_documents
+            if any(page.get("needs_ocr") for page in pages_by_document[document.id])
+        ]
+        ocr_ids = {document.id for document in ocr_documents}
+        stage([document for document in pdf_documents if document.id not in ocr_ids], "ocr", "skipped")
+        stage(ocr_documents + image_documents, "ocr", "running")
+
+        def run_ocr(document: Document) -> List[Dict[str, Any]]:
+            if document.id in image_ids:
+                return DocumentService.process_image(document.file_path)
+            return DocumentService.ocr_pages(document.file_path, pages_by_document[document.id])
+
+        ocr_targets = ocr_documents + image_documents
+        if ocr_targets:
+            with ThreadPoolExecutor(max_workers=min(OCR_WORKERS, len(ocr_targets)), thread_name_prefix="batch-ocr") as executor:
+                for document, pages in zip(ocr_targets, executor.map(run_ocr, ocr_targets)):
+                    pages_by_document[document.id] = pages
+        stage(ocr_targets, "ocr", "completed")
+
+        for document in documents:
+            pages = pages_by_document[document.id]
+            document.metadata.page_count = len(pages)
+            document.metadata.ocr_processed = any(page.get("ocr_processed") for page in pages)
+            document.metadata.ocr_errors = [
+                OCRError(page_num=page["page_num"], error=page["ocr_error"])
+                for page in pages
+                if page.get("ocr_error")
+            ]
+            document.pages = [
+                DocumentPage(page_num=page["page_num"], text=page["text"])
+                for page in pages
+            ]
+
+        stage(documents, "chunk", "running")
+        chunks_by_document = {
+            document.id: ChunkingService.chunk_pages(pages_by_document[document.id])
+            for document in documents
+        }
+        stage(documents, "chunk", "completed")
+
+        stage(documents, "embed", "running")
+        document_metadata = {
+            document.id: VectorService.document_metadata(document.file_type, document.metadata.upload_date)
+            for document in documents
+        }
+        try:
+            embedding_ids = VectorService.create_embeddings_for_documents(chunks_by_document, document_metadata=document_metadata)
+            for document in documents:
+                ids_by_page = VectorService.embedding_ids_by_page(embedding_ids[document.id], chunks_by_document[document.id])
+                for page in document.pages:
+                    page.embedding_ids = ids_by_page.get(page.page_num, [])
         except Exception as e:
-            logger.error(f"Error creating document: {str(e)}")
+            # Re-raised so the ingestion job marks the embed stage and the documents as failed
+            # instead of storing them as processed without vectors.
+            logger.error(f"Error creating embeddings: {str(e)}")
             raise
+        for document_id, chunks in chunks_by_document.items():
+            try:
+                LexicalIndexService.index_chunks(document_id, chunks, document_metadata=document_metadata.get(document_id))
+            except Exception as e:
+                logger.error(f"Error updating lexical index: {str(e)}")
+        stage(documents, "embed", "completed")
+
+        for document in documents:
+            document.metadata.processed = True
+            document.metadata.last_modified = datetime.now(timezone.utc)
+
+        stage(documents, "store", "running")
+        if get_documents_collection() is None:
+            logger.info("Documents were only processed for vector embeddings since MongoDB is not available")
+            stage(documents, "store", "skipped")
+        else:
+            try:
+                PageService.save_pages_for_documents({document.id: document.pages for document in documents})
+                get_documents_collection().bulk_write([
+                    UpdateOne({"_id": document.id}, {"$set": {"metadata": document.metadata.model_dump()}})
+                    for document in documents
+                ], ordered=False)
+                stage(documents, "store", "completed")
+            except Exception as e:
+                logger.error(f"Error storing documents in MongoDB: {str(e)}")
+                raise
+
+        return documents
 
     @staticmethod
     def get_all_documents() -> List[Document]:
         try:
-            if documents_collection is None:
+            if get_documents_collection() is None:
                 logger.warning("MongoDB documents collection is not initialized")
                 return []
 
-            cursor = documents_collection.find()
+            cursor = get_documents_collection().find({}, {"pages": 0})
             documents = []
             for doc_data in cursor:
                 try:
@@ -185,15 +523,159 @@ class DocumentService:
             logger.error(f"Error getting all documents: {str(e)}")
             return []
 
+    @staticmethod
+    def encode_cursor(sort_by: str, doc_data: Dict[str, Any]) -> str:
+        value = doc_data["title"] if sort_by == "title" else doc_data["metadata"]["upload_date"]
+        if isinstance(value, datetime):
+            value = {"$date": value.isoformat()}
+        payload = json.dumps({"value": value, "id": doc_data["_id"]})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[Any, str]:
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            value = payload["value"]
+            if isinstance(value, dict):
+                value = datetime.fromisoformat(value["$date"])
+            return value, payload["id"]
+        except Exception:
+            raise ValueError("Invalid pagination cursor")
+
+    @staticmethod
+    def build_list_query(
+        cursor: Optional[str] = None,
+        sort_by: str = "upload_date",
+        sort_order: str = "desc",
+        file_type: Optional[str] = None,
+        uploaded_after: Optional[datetime] = None,
+        uploaded_before: Optional[datetime] = None
+    ) -> Tuple[Dict[str, Any], List[Tuple[str, int]]]:
+        if sort_by not in DOCUMENT_SORT_FIELDS:
+            raise ValueError(f"Unsupported sort field: {sort_by}")
+
+        sort_field = DOCUMENT_SORT_FIELDS[sort_by]
+        direction = pymongo.ASCENDING if sort_order == "asc" else pymongo.DESCENDING
+        comparison = "$gt" if direction == pymongo.ASCENDING else "$lt"
+
+        filters = []
+        if file_type:
+            filters.append({"file_type": file_type.lower().lstrip(".")})
+        if uploaded_after or uploaded_before:
+            date_range = {}
+            if uploaded_after:
+                date_range["$gte"] = uploaded_after
+            if uploaded_before:
+                date_range["$lt"] = uploaded_before
+            filters.append({"metadata.upload_date": date_range})
+        if cursor:
+            # Keyset pagination: continue strictly after the last (sort value, _id) seen.
+            value, last_id = DocumentService.decode_cursor(cursor)
+            filters.append({"$or": [
+                {sort_field: {comparison: value}},
+                {sort_field: value, "_id": {comparison: last_id}}
+            ]})
+        query = {"$and": filters} if filters else {}
+        return query, [(sort_field, direction), ("_id", direction)]
+
+    @staticmethod
+    def build_list_page(records: List[Dict[str, Any]], limit: int, sort_by: str) -> Tuple[List[DocumentResponse], Optional[str]]:
+        next_cursor = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_cursor = DocumentService.encode_cursor(sort_by, records[-1])
+
+        documents = []
+        for doc_data in records:
+            try:
+                metadata = doc_data["metadata"]
+                documents.append(DocumentResponse(
+                    id=doc_data["_id"],
+                    title=doc_data["title"],
+                    file_type=doc_data["file_type"],
+                    original_filename=doc_data["original_filename"],
+                    page_count=metadata["page_count"],
+                    processed=metadata.get("processed", False),
+                    ocr_processed=metadata.get("ocr_processed", False),
+                    file_size=metadata["file_size"],
+                    upload_date=metadata["upload_date"],
+                    last_modified=metadata["last_modified"]
+                ))
+            except Exception as doc_error:
+                logger.error(f"Error parsing document: {str(doc_error)}")
+
+        return documents, next_cursor
+
+    @staticmethod
+    def list_documents(
+        limit: int = DOCUMENT_LIST_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        sort_by: str = "upload_date",
+        sort_order: str = "desc",
+        file_type: Optional[str] = None,
+        uploaded_after: Optional[datetime] = None,
+        uploaded_before: Optional[datetime] = None
+    ) -> Tuple[List[DocumentResponse], Optional[str]]:
+        if get_documents_collection() is None:
+            logger.warning("MongoDB documents collection is not initialized")
+            return [], None
+
+        query, sort = DocumentService.build_list_query(cursor, sort_by, sort_order, file_type, uploaded_after, uploaded_before)
+        records = list(
+            get_documents_collection().find(query, DOCUMENT_SUMMARY_PROJECTION)
+            .sort(sort)
+            .limit(limit + 1)
+        )
+        return DocumentService.build_list_page(records, limit, sort_by)
+
+    @staticmethod
+    async def alist_documents(
+        limit: int = DOCUMENT_LIST_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        sort_by: str = "upload_date",
+        sort_order: str = "desc",
+        file_type: Optional[str] = None,
+        uploaded_after: Optional[datetime] = None,
+        uploaded_before: Optional[datetime] = None
+    ) -> Tuple[List[DocumentResponse], Optional[str]]:
+        if get_async_documents_collection() is None:
+            return await asyncio.to_thread(
+                DocumentService.list_documents,
+                limit, cursor, sort_by, sort_order, file_type, uploaded_after, uploaded_before
+            )
+
+        query, sort = DocumentService.build_list_query(cursor, sort_by, sort_order, file_type, uploaded_after, uploaded_before)
+        records = await (
+            get_async_documents_collection().find(query, DOCUMENT_SUMMARY_PROJECTION)
+            .sort(sort)
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        )
+        return DocumentService.build_list_page(records, limit, sort_by)
+
     @staticmethod
     def get_document(document_id: str) -> Optional[Document]:
         try:
-            if documents_collection is None:
+            if get_documents_collection() is None:
                 logger.warning("MongoDB documents collection is not initialized")
                 logger.info(f"Cannot retrieve document {document_id} since MongoDB is not available")
                 return None
 
-            doc_data = documents_collection.find_one({"_id": document_id})
+            doc_data = get_documents_collection().find_one({"_id": document_id}, {"pages": 0})
+            if not doc_data:
+                return None
+
+            return Document(**doc_data)
+        except Exception as e:
+            logger.error(f"Error getting document: {str(e)}")
+            return None
+
+    @staticmethod
+    async def aget_document(document_id: str) -> Optional[Document]:
+        if get_async_documents_collection() is None:
+            return await asyncio.to_thread(DocumentService.get_document, document_id)
+        try:
+            doc_data = await get_async_documents_collection().find_one({"_id": document_id}, {"pages": 0})
             if not doc_data:
                 return None
 
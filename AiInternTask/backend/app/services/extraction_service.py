@@ -0,0 +1,61 @@
+import logging
+import math
+from typing import List, Dict, Any, Tuple
+import pypdf
+from ..config import OCR_MIN_TEXT_CHARS, OCR_MIN_IMAGE_COVERAGE
+
+logger = logging.getLogger(__name__)
+
+# Kept free of database and model imports: these functions also run in the
+# spawned CPU pool workers, which import this module on their own.
+
+def extract_page(page: pypdf.PageObject) -> Tuple[str, float]:
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    xobjects = xobjects.get_object() if xobjects is not None else {}
+    image_area = 0.0
+
+    def visit(operator, operands, cm, tm):
+        nonlocal image_area
+        if operator == b"Do" and operands:
+            xobject = xobjects.get(operands[0])
+            if xobject is not None and xobject.get_object().get("/Subtype") == "/Image":
+                # The current transformation matrix maps the unit square onto the drawn image.
+                image_area += math.hypot(cm[0], cm[1]) * math.hypot(cm[2], cm[3])
+
+    text = page.extract_text(visitor_operand_before=visit) or ""
+    page_area = float(page.mediabox.width) * float(page.mediabox.height)
+    coverage = min(1.0, image_area / page_area) if page_area > 0 else 0.0
+    return text, coverage
+
+def extract_pdf_text_layer(file_path: str) -> List[Dict[str, Any]]:
+    try:
+        with open(file_path, "rb") as f:
+            pdf = pypdf.PdfReader(f)
+            pages = []
+
+            for i, page in enumerate(pdf.pages):
+                text, coverage = extract_page(page)
+                text_length = len(text.strip())
+
+                # A page needs OCR when its text layer is empty, or when it is
+                # mostly a scanned image with only a stray line of real text.
+                needs_ocr = text_length == 0 or (
+                    text_length < OCR_MIN_TEXT_CHARS and coverage >= OCR_MIN_IMAGE_COVERAGE
+                )
+                pages.append({
+                    "page_num": i + 1,
+                    "text": text or "No text could be extracted from this page.",
+                    "needs_ocr": needs_ocr
+                })
+
+            ocr_count = sum(1 for page in pages if page["needs_ocr"])
+            logger.info(f"Text layer found on {len(pages) - ocr_count} of {len(pages)} pages; {ocr_count} need OCR")
+            return pages
+    except Exception as e:
+        logger.error(f"Error processing PDF: {str(e)}")
+        return [{
+            "page_num": 1,
+            "text": f"Error processing PDF: {str(e)}",
+            "needs_ocr": False
+        }]
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional
+from ..core.http_client import get_ollama_probe_session, ollama_timeout
+from ..config import (
+    OLLAMA_API_URL,
+    OLLAMA_MODEL,
+    OLLAMA_HEALTH_TTL,
+    OLLAMA_FAILURE_THRESHOLD,
+    OLLAMA_CIRCUIT_RESET_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half-open"
+
+class OllamaHealthService:
+    _lock = threading.Lock()
+    _available: Optional[bool] = None
+    _checked_at = 0.0
+    _refreshing = False
+    _consecutive_failures = 0
+    _circuit_state = CIRCUIT_CLOSED
+    _opened_at = 0.0
+    _refresh_thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def probe() -> bool:
+        try:
+            try:
+                response = get_ollama_probe_session().get(f"{OLLAMA_API_URL.rstrip('/api')}/version", timeout=ollama_timeout(5))
+                if response.status_code == 200:
+                    logger.info(f"Ollama is available at {OLLAMA_API_URL.rstrip('/api')}/version")
+                    return True
+            except Exception as e:
+                logger.warning(f"Could not connect to Ollama version endpoint: {str(e)}")
+
+            try:
+                response = get_ollama_probe_session().get(f"{OLLAMA_API_URL}/tags", timeout=ollama_timeout(5))
+                if response.status_code == 200:
+                    models = response.json().get("models", [])
+                    model_names = [model.get("name", "").split(":")[0] for model in models]
+
+                    logger.info(f"Available Ollama models: {model_names}")
+
+                    if OLLAMA_MODEL in model_names or any(model.startswith(OLLAMA_MODEL) for model in model_names):
+                        logger.info(f"Ollama model {OLLAMA_MODEL} is available")
+                        return True
+                    else:
+                        logger.warning(f"Ollama is available but model {OLLAMA_MODEL} is not found. Available models: {model_names}")
+                        return False
+
+                logger.info(f"Ollama is available at {OLLAMA_API_URL}")
+                return True
+            except Exception as e:
+                logger.warning(f"Could not connect to Ollama API endpoint: {str(e)}")
+
+            return False
+        except Exception as e:
+            logger.error(f"Error checking Ollama availability: {str(e)}")
+            return False
+
+    @staticmethod
+    def refresh() -> bool:
+        available = OllamaHealthService.probe()
+        with OllamaHealthService._lock:
+            OllamaHealthService._available = available
+            OllamaHealthService._checked_at = time.monotonic()
+            OllamaHealthService._refreshing = False
+        if available:
+            OllamaHealthService.record_success()
+        else:
+            OllamaHealthService.record_failure()
+        return available
+
+    @staticmethod
+    def _refresh_in_background() -> None:
+        with OllamaHealthService._lock:
+            if OllamaHealthService._refreshing:
+                return
+            OllamaHealthService._refreshing = True
+        threading.Thread(target=OllamaHealthService.refresh, name="ollama-health-refresh", daemon=True).start()
+
+    @staticmethod
+    def allow_request() -> bool:
+        with OllamaHealthService._lock:
+            if OllamaHealthService._circuit_state == CIRCUIT_CLOSED:
+                return True
+            if OllamaHealthService._circuit_state == CIRCUIT_HALF_OPEN:
+                return False
+            if time.monotonic() - OllamaHealthService._opened_at < OLLAMA_CIRCUIT_RESET_SECONDS:
+                return False
+            # Let a single trial request through; its outcome closes or re-opens the circuit.
+            OllamaHealthService._circuit_state = CIRCUIT_HALF_OPEN
+            logger.info("Ollama circuit half-open, allowing a trial request")
+            return True
+
+    @staticmethod
+    def record_success() -> None:
+        with OllamaHealthService._lock:
+            if OllamaHealthService._circuit_state != CIRCUIT_CLOSED:
+                logger.info("Ollama circuit closed")
+            OllamaHealthService._consecutive_failures = 0
+            OllamaHealthService._circuit_state = CIRCUIT_CLOSED
+
+    @staticmethod
+    def record_failure() -> None:
+        with OllamaHealthService._lock:
+            OllamaHealthService._consecutive_failures += 1
+            should_open = (
+                OllamaHealthService._circuit_state == CIRCUIT_HALF_OPEN
+                or OllamaHealthService._consecutive_failures >= OLLAMA_FAILURE_THRESHOLD
+            )
+            if should_open:
+                if OllamaHealthService._circuit_state != CIRCUIT_OPEN:
+                    logger.warning(f"Ollama circuit opened after {OllamaHealthService._consecutive_failures} consecutive failures")
+                OllamaHealthService._circuit_state = CIRCUIT_OPEN
+                OllamaHealthService._opened_at = time.monotonic()
+                OllamaHealthService._available = False
+                OllamaHealthService._checked_at = time.monotonic()
+
+    @staticmethod
+    def is_available() -> bool:
+        if not OllamaHealthService.allow_request():
+            return False
+
+        with OllamaHealthService._lock:
+            available = OllamaHealthService._available
+            circuit_state = OllamaHealthService._circuit_state
+            age = time.monotonic() - OllamaHealthService._checked_at
+
+        if available is None or circuit_state == CIRCUIT_HALF_OPEN:
+            return OllamaHealthService.refresh()
+
+        if age > OLLAMA_HEALTH_TTL:
+            OllamaHealthService._refresh_in_background()
+        return available
+
+    @staticmethod
+    def start_background_refresh(interval: Optional[float] = None) -> None:
+        interval = interval or OLLAMA_HEALTH_TTL
+
+        def refresh_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if OllamaHealthService.allow_request():
+                        OllamaHealthService.refresh()
+                except Exception as e:
+                    logger.error(f"Error refreshing Ollama health: {str(e)}")
+
+        with OllamaHealthService._lock:
+            if OllamaHealthService._refresh_thread is not None:
+                return
+            OllamaHealthService._refresh_thread = threading.Thread(
+                target=refresh_loop,
+                name="ollama-health-loop",
+                daemon=True
+            )
+            OllamaHealthService._refresh_thread.start()
+
+    @staticmethod
+    def status() -> Dict[str, Any]:
+        with OllamaHealthService._lock:
+            checked_seconds_ago = None
+            if OllamaHealthService._available is not None:
+                checked_seconds_ago = round(time.monotonic() - OllamaHealthService._checked_at, 1)
+            return {
+                "available": bool(OllamaHealthService._available),
+                "circuit": OllamaHealthService._circuit_state,
+                "consecutive_failures": OllamaHealthService._consecutive_failures,
+                "checked_seconds_ago": checked_seconds_ago
+            }
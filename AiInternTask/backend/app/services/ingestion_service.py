@@ -0,0 +1,283 @@
+import asyncio
+import copy
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from pymongo import UpdateOne
+from ..models.document import Document, DocumentStatusResponse, IngestionStage
+from ..core.database import get_documents_collection, get_async_documents_collection
+from ..config import INGESTION_WORKERS, INGESTION_BATCH_DOCUMENTS, INGESTION_LEASE_SECONDS
+from .document_service import DocumentService
+
+logger = logging.getLogger(__name__)
+
+INGESTION_STAGES = ["upload", "extract", "ocr", "chunk", "embed", "store"]
+FINISHED_STAGE_STATUSES = ("completed", "skipped")
+UNFINISHED_JOB_STATUSES = ("queued", "processing")
+STATUS_PROJECTION = {"ingestion": 1, "metadata.processed": 1}
+
+class IngestionService:
+    _executor = ThreadPoolExecutor(max_workers=INGESTION_WORKERS, thread_name_prefix="ingestion")
+    _jobs: Dict[str, Dict[str, Any]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def owner() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def new_job() -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        job = {
+            "status": "queued",
+            "current_stage": None,
+            "error": None,
+            "owner": IngestionService.owner(),
+            "updated_at": now,
+            "stages": [{"name": name, "status": "pending", "started_at": None, "finished_at": None} for name in INGESTION_STAGES]
+        }
+        job["stages"][0].update({"status": "completed", "started_at": now, "finished_at": now})
+        return job
+
+    @staticmethod
+    def submit(document: Document) -> None:
+        IngestionService.submit_batch([document])
+
+    @staticmethod
+    def submit_batch(documents: List[Document]) -> None:
+        if not documents:
+            return
+
+        jobs = {document.id: IngestionService.new_job() for document in documents}
+        IngestionService._persist_many(copy.deepcopy(jobs))
+        IngestionService._queue(documents, jobs)
+
+    @staticmethod
+    def _queue(documents: List[Document], jobs: Dict[str, Dict[str, Any]]) -> None:
+        with IngestionService._lock:
+            IngestionService._jobs.update(jobs)
+
+        # Each group is ingested together; with several workers one group can be
+        # extracting while another is embedding.
+        for start in range(0, len(documents), INGESTION_BATCH_DOCUMENTS):
+            IngestionService._executor.submit(IngestionService.run_batch, documents[start:start + INGESTION_BATCH_DOCUMENTS])
+        logger.info(f"Queued {len(documents)} documents for ingestion")
+
+    @staticmethod
+    def run(document: Document) -> None:
+        IngestionService.run_batch([document])
+
+    @staticmethod
+    def run_batch(documents: List[Document]) -> None:
+        document_ids = [document.id for document in documents]
+        IngestionService._update_many(document_ids, status="processing")
+        try:
+            DocumentService.ingest_batch(documents, on_stage=IngestionService.update_stages)
+            IngestionService._update_many(document_ids, status="completed", current_stage=None)
+            logger.info(f"Finished ingesting documents {', '.join(document_ids)}")
+        except Exception as e:
+            logger.error(f"Error ingesting documents {', '.join(document_ids)}: {str(e)}")
+            with IngestionService._lock:
+                current_stages = {}
+                for document_id in document_ids:
+                    job = IngestionService._jobs.get(document_id)
+                    if job and job["current_stage"]:
+                        current_stages.setdefault(job["current_stage"], []).append(document_id)
+            for stage_name, stage_document_ids in current_stages.items():
+                IngestionService.update_stages(stage_document_ids, stage_name, "failed")
+            IngestionService._update_many(document_ids, status="failed", error=str(e))
+        finally:
+            for document_id in document_ids:
+                IngestionService._forget_if_persisted(document_id)
+
+    @staticmethod
+    def update_stage(document_id: str, name: str, status: str) -> None:
+        IngestionService.update_stages([document_id], name, status)
+
+    @staticmethod
+    def update_stages(document_ids: List[str], name: str, status: str) -> None:
+        now = datetime.now(timezone.utc)
+        snapshots = {}
+        with IngestionService._lock:
+            for document_id in document_ids:
+                job = IngestionService._jobs.get(document_id)
+                if job is None:
+                    continue
+                for stage in job["stages"]:
+                    if stage["name"] != name:
+                        continue
+                    if status == "running":
+                        stage["started_at"] = now
+                        job["current_stage"] = name
+                    else:
+                        stage["finished_at"] = now
+                    stage["status"] = status
+                job["updated_at"] = now
+                snapshots[document_id] = copy.deepcopy(job)
+        IngestionService._persist_many(snapshots)
+
+    @staticmethod
+    def _update_many(document_ids: List[str], **fields: Any) -> None:
+        snapshots = {}
+        with IngestionService._lock:
+            for document_id in document_ids:
+                job = IngestionService._jobs.get(document_id)
+                if job is None:
+                    continue
+                job.update(fields, updated_at=datetime.now(timezone.utc))
+                snapshots[document_id] = copy.deepcopy(job)
+        IngestionService._persist_many(snapshots)
+
+    @staticmethod
+    def _persist_many(jobs: Dict[str, Dict[str, Any]]) -> None:
+        if get_documents_collection() is None or not jobs:
+            return
+        try:
+            get_documents_collection().bulk_write([
+                UpdateOne({"_id": document_id}, {"$set": {"ingestion": job}})
+                for document_id, job in jobs.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Error saving ingestion status for documents {', '.join(jobs)}: {str(e)}")
+
+    @staticmethod
+    def _forget_if_persisted(document_id: str) -> None:
+        # Finished jobs are served from MongoDB; keep them in memory only when there is no database.
+        if get_documents_collection() is None:
+            return
+        with IngestionService._lock:
+            IngestionService._jobs.pop(document_id, None)
+
+    @staticmethod
+    def _in_memory_job(document_id: str) -> Optional[Dict[str, Any]]:
+        with IngestionService._lock:
+            job = IngestionService._jobs.get(document_id)
+            return copy.deepcopy(job) if job else None
+
+    @staticmethod
+    def _job_from_record(doc_data: Dict[str, Any]) -> Dict[str, Any]:
+        job = doc_data.get("ingestion")
+        if job is None:
+            # Documents uploaded before background ingestion existed were processed inline.
+            processed = doc_data.get("metadata", {}).get("processed", False)
+            status = "completed" if processed else "unknown"
+            job = {
+                "status": status,
+                "current_stage": None,
+                "error": None,
+                "stages": [{"name": name, "status": status} for name in INGESTION_STAGES]
+            }
+        return job
+
+    @staticmethod
+    def _status_response(document_id: str, job: Dict[str, Any]) -> DocumentStatusResponse:
+        stages = [IngestionStage(**stage) for stage in job["stages"]]
+        finished = sum(1 for stage in stages if stage.status in FINISHED_STAGE_STATUSES)
+        return DocumentStatusResponse(
+            document_id=document_id,
+            status=job["status"],
+            current_stage=job.get("current_stage"),
+            progress=round(finished / len(stages), 2) if stages else 0.0,
+            stages=stages,
+            error=job.get("error")
+        )
+
+    @staticmethod
+    def get_status(document_id: str) -> Optional[DocumentStatusResponse]:
+        job = IngestionService._in_memory_job(document_id)
+
+        if job is None and get_documents_collection() is not None:
+            doc_data = get_documents_collection().find_one({"_id": document_id}, STATUS_PROJECTION)
+            if not doc_data:
+                return None
+            job = IngestionService._job_from_record(doc_data)
+
+        if job is None:
+            return None
+        return IngestionService._status_response(document_id, job)
+
+    @staticmethod
+    async def aget_status(document_id: str) -> Optional[DocumentStatusResponse]:
+        if get_async_documents_collection() is None:
+            return await asyncio.to_thread(IngestionService.get_status, document_id)
+
+        job = IngestionService._in_memory_job(document_id)
+        if job is None:
+            doc_data = await get_async_documents_collection().find_one({"_id": document_id}, STATUS_PROJECTION)
+            if not doc_data:
+                return None
+            job = IngestionService._job_from_record(doc_data)
+        return IngestionService._status_response(document_id, job)
+
+    @staticmethod
+    def _held_elsewhere(job: Optional[Dict[str, Any]]) -> bool:
+        if job is None or job["status"] not in UNFINISHED_JOB_STATUSES or not job.get("owner"):
+            return False
+        if job["owner"] == IngestionService.owner():
+            return True
+
+        host, _, pid = job["owner"].rpartition(":")
+        if host == socket.gethostname() and os.name == "posix" and pid.isdigit():
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                pass
+
+        # MongoDB hands datetimes back without a timezone; they are stored in UTC.
+        updated_at = job["updated_at"].replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - updated_at).total_seconds() < INGESTION_LEASE_SECONDS
+
+    @staticmethod
+    def _claim(document_id: str, previous_job: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        # Only succeeds while the record still holds the job that was read, so when
+        # several workers start together each document is resumed by exactly one of them.
+        if previous_job is None:
+            claim_query = {"_id": document_id, "ingestion": {"$exists": False}}
+        else:
+            claim_query = {
+                "_id": document_id,
+                "ingestion.owner": previous_job.get("owner"),
+                "ingestion.updated_at": previous_job.get("updated_at")
+            }
+        job = IngestionService.new_job()
+        claimed = get_documents_collection().find_one_and_update(
+            {**claim_query, "metadata.processed": False},
+            {"$set": {"ingestion": job}},
+            projection={"_id": 1}
+        )
+        return job if claimed else None
+
+    @staticmethod
+    def resume_pending() -> int:
+        # Called at startup. Failed ingestion is left for the user to retry by uploading
+        # the file again, since resuming it here would fail the same way on every restart.
+        if get_documents_collection() is None:
+            return 0
+        documents = []
+        jobs = {}
+        try:
+            pending_query = {"metadata.processed": False, "ingestion.status": {"$ne": "failed"}}
+            for doc_data in get_documents_collection().find(pending_query, {"pages": 0}):
+                previous_job = doc_data.get("ingestion")
+                if IngestionService._held_elsewhere(previous_job):
+                    continue
+                try:
+                    document = Document(**doc_data)
+                    job = IngestionService._claim(document.id, previous_job)
+                    if job is not None:
+                        documents.append(document)
+                        jobs[document.id] = job
+                except Exception as doc_error:
+                    logger.error(f"Error resuming ingestion for document {doc_data.get('_id')}: {str(doc_error)}")
+        except Exception as e:
+            logger.error(f"Error looking up pending documents: {str(e)}")
+        if documents:
+            IngestionService._queue(documents, jobs)
+            logger.info(f"Resumed ingestion for {len(documents)} unprocessed documents")
+        return len(documents)
@@ -0,0 +1,189 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Set, Tuple
+from ..config import LEXICAL_INDEX_PATH
+from ..models.query import QueryFilters
+from .vector_service import VectorService
+
+logger = logging.getLogger(__name__)
+
+# Identifiers such as "2021-CV-0042" or "18.U.S.C" are kept together and matched as a phrase.
+QUERY_TERM = re.compile(r"\w+(?:[-./:]\w+)*")
+# Common words match nearly every chunk, so OR-ing them in only adds noise to the BM25 ranking.
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being
+between both but by can could did do does doing down during each few for from further had
+has have having he her here hers him his how i if in into is it its itself just me more most
+my no nor not now of off on once only or other our ours out over own same she should so some
+such than that the their theirs them then there these they this those through to too under
+until up very was we were what when where which while who whom why will with would you your
+""".split())
+# Terms that are unlikely to carry meaning an embedding can capture, e.g. case or section numbers
+IDENTIFIER_TERM = re.compile(r"(?=.*\d)(?=.*[^\W\d])|.*[-./:]")
+
+# FTS5 keeps the inverted index and ranks matches with BM25. File type and upload
+# timestamp are stored alongside each chunk so query filters are applied in SQL.
+CREATE_CHUNKS_TABLE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5("
+    "embedding_id UNINDEXED, document_id UNINDEXED, page_num UNINDEXED, "
+    "chunk_index UNINDEXED, paragraph UNINDEXED, file_type UNINDEXED, upload_timestamp UNINDEXED, text, "
+    "tokenize = 'unicode61 remove_diacritics 2')"
+)
+
+class LexicalIndexService:
+    _lock = threading.Lock()
+    _connection: Optional[sqlite3.Connection] = None
+
+    @staticmethod
+    def get_connection() -> sqlite3.Connection:
+        if LexicalIndexService._connection is not None:
+            return LexicalIndexService._connection
+
+        with LexicalIndexService._lock:
+            if LexicalIndexService._connection is None:
+                os.makedirs(os.path.dirname(LEXICAL_INDEX_PATH), exist_ok=True)
+                connection = sqlite3.connect(LEXICAL_INDEX_PATH, timeout=5, check_same_thread=False)
+                connection.execute("PRAGMA journal_mode=WAL")
+                columns = [row[1] for row in connection.execute("PRAGMA table_info(chunks)")]
+                if columns and "file_type" not in columns:
+                    LexicalIndexService.add_filter_columns(connection)
+                connection.execute(CREATE_CHUNKS_TABLE)
+                connection.commit()
+                LexicalIndexService._connection = connection
+        return LexicalIndexService._connection
+
+    @staticmethod
+    def add_filter_columns(connection: sqlite3.Connection) -> None:
+        # FTS5 tables cannot be altered, so an index from before query filters is copied
+        # into the new layout. Its chunks have no file type or upload date until
+        # build_lexical_index is run, and filtered searches skip them until then.
+        connection.execute("ALTER TABLE chunks RENAME TO chunks_unfiltered")
+        connection.execute(CREATE_CHUNKS_TABLE)
+        connection.execute(
+            "INSERT INTO chunks SELECT embedding_id, document_id, page_num, chunk_index, paragraph, NULL, NULL, text "
+            "FROM chunks_unfiltered"
+        )
+        connection.execute("DROP TABLE chunks_unfiltered")
+        logger.warning("Added filter columns to the lexical index; run python -m app.migrations.build_lexical_index to fill them in")
+
+    @staticmethod
+    def index_chunks(
+        document_id: str,
+        chunks: List[Dict[str, Any]],
+        embedding_ids: Optional[List[str]] = None,
+        document_metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        if embedding_ids is None:
+            embedding_ids = [VectorService.chunk_embedding_id(document_id, chunk) for chunk in chunks]
+        document_metadata = document_metadata or {}
+
+        rows = [
+            (
+                embedding_id,
+                str(document_id),
+                chunk["page_num"],
+                chunk.get("chunk_index"),
+                chunk.get("paragraph_start"),
+                document_metadata.get("file_type"),
+                document_metadata.get("upload_timestamp"),
+                chunk["text"]
+            )
+            for embedding_id, chunk in zip(embedding_ids, chunks)
+        ]
+
+        connection = LexicalIndexService.get_connection()
+        with LexicalIndexService._lock:
+            connection.execute("DELETE FROM chunks WHERE document_id = ?", (str(document_id),))
+            connection.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            connection.commit()
+        logger.info(f"Indexed {len(rows)} chunks of document {document_id} for lexical search")
+
+    @staticmethod
+    def delete_document(document_id: str) -> None:
+        connection = LexicalIndexService.get_connection()
+        with LexicalIndexService._lock:
+            connection.execute("DELETE FROM chunks WHERE document_id = ?", (str(document_id),))
+            connection.commit()
+
+    @staticmethod
+    def document_ids() -> Set[str]:
+        connection = LexicalIndexService.get_connection()
+        with LexicalIndexService._lock:
+            return {document_id for (document_id,) in connection.execute("SELECT DISTINCT document_id FROM chunks")}
+
+    @staticmethod
+    def build_match_query(query: str) -> Optional[str]:
+        terms = []
+        for term in QUERY_TERM.findall(query):
+            if (len(term) < 2 and not term.isdigit()) or term.lower() in STOPWORDS:
+                continue
+            quoted = '"' + term.replace('"', '""') + '"'
+            if quoted not in terms:
+                terms.append(quoted)
+        return " OR ".join(terms) if terms else None
+
+    @staticmethod
+    def identifier_terms(text: str) -> Set[str]:
+        return {term for term in QUERY_TERM.findall(text.lower()) if IDENTIFIER_TERM.match(term)}
+
+    @staticmethod
+    def build_filter_clause(filters: Optional[QueryFilters]) -> Tuple[str, List[Any]]:
+        # Mirrors VectorService.build_where so both retrievers see the same documents.
+        if filters is None:
+            return "", []
+
+        conditions = []
+        params = []
+        if filters.document_ids:
+            conditions.append(f"document_id IN ({', '.join('?' for _ in filters.document_ids)})")
+            params.extend(str(document_id) for document_id in filters.document_ids)
+        if filters.file_type:
+            conditions.append("file_type = ?")
+            params.append(filters.file_type.lower().lstrip("."))
+        if filters.uploaded_after:
+            conditions.append("upload_timestamp >= ?")
+            params.append(VectorService.timestamp(filters.uploaded_after))
+        if filters.uploaded_before:
+            conditions.append("upload_timestamp < ?")
+            params.append(VectorService.timestamp(filters.uploaded_before))
+        return "".join(f" AND {condition}" for condition in conditions), params
+
+    @staticmethod
+    def search(query: str, top_k: int = 10, filters: Optional[QueryFilters] = None) -> List[Dict[str, Any]]:
+        match_query = LexicalIndexService.build_match_query(query)
+        if not match_query:
+            return []
+
+        filter_clause, filter_params = LexicalIndexService.build_filter_clause(filters)
+        sql = (
+            "SELECT embedding_id, document_id, page_num, chunk_index, paragraph, text, bm25(chunks) "
+            f"FROM chunks WHERE chunks MATCH ?{filter_clause} ORDER BY bm25(chunks) LIMIT ?"
+        )
+        params = [match_query, *filter_params, top_k]
+
+        try:
+            connection = LexicalIndexService.get_connection()
+            with LexicalIndexService._lock:
+                rows = connection.execute(sql, params).fetchall()
+        except Exception as e:
+            logger.error(f"Error searching lexical index: {str(e)}")
+            return []
+
+        identifiers = LexicalIndexService.identifier_terms(query)
+        return [
+            {
+                "embedding_id": embedding_id,
+                "document_id": document_id,
+                "page_num": page_num,
+                "chunk_index": chunk_index,
+                "paragraph": paragraph,
+                "text": text,
+                # SQLite's bm25() is negative, with better matches further below zero.
+                "bm25_score": -score,
+                "identifier_match": bool(identifiers & LexicalIndexService.identifier_terms(text))
+            }
+            for embedding_id, document_id, page_num, chunk_index, paragraph, text, score in rows
+        ]
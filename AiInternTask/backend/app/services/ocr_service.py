@@ -1,12 +1,17 @@
 import logging
-from typing import List, Dict, Any
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional
 from PIL import Image
 import shutil
 import subprocess
+from ..config import OCR_DPI, OCR_WORKERS
 
 try:
     import pytesseract
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     TESSERACT_AVAILABLE = True
 except ImportError:
     TESSERACT_AVAILABLE = False
@@ -31,57 +36,79 @@ OCR_AVAILABLE = is_tesseract_installed()
 
 logger = logging.getLogger(__name__)
 
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+
+def ocr_pdf_page(pdf_path: str, page_num: int, dpi: int) -> str:
+    # Runs in a worker process: rasterize a single page to a temporary file
+    # so only one page image per worker is ever held in memory.
+    with tempfile.TemporaryDirectory() as output_folder:
+        image_paths = convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            first_page=page_num,
+            last_page=page_num,
+            output_folder=output_folder,
+            paths_only=True
+        )
+        if not image_paths:
+            return ""
+        with Image.open(image_paths[0]) as image:
+            return pytesseract.image_to_string(image)
+
 class OCRService:
 
     @staticmethod
     def process_image(image_path: str) -> str:
+        # Failures are raised rather than returned as text, so they never end up indexed as page content.
         if not OCR_AVAILABLE:
-            logger.warning("OCR is not available. Tesseract is not installed or not in PATH.")
-            return "OCR processing not available. Text extraction skipped."
-        try:
-            image = Image.open(image_path)
-            text = pytesseract.image_to_string(image)
-            return text
-        except Exception as e:
-            logger.error(f"Error processing image with OCR: {str(e)}")
-            return "Error during OCR processing. Text extraction failed."
+            raise RuntimeError("OCR is not available. Tesseract is not installed or not in PATH.")
+        with Image.open(image_path) as image:
+            return pytesseract.image_to_string(image)
+
+    @staticmethod
+    def get_pool() -> ProcessPoolExecutor:
+        global _ocr_pool
+        with _ocr_pool_lock:
+            if _ocr_pool is None:
+                # Spawned workers do not inherit the server's threads or open sockets.
+                _ocr_pool = ProcessPoolExecutor(
+                    max_workers=OCR_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return _ocr_pool
+
+    @staticmethod
+    def shutdown_pool() -> None:
+        global _ocr_pool
+        with _ocr_pool_lock:
+            if _ocr_pool is not None:
+                _ocr_pool.shutdown(wait=False)
+                _ocr_pool = None
 
     @staticmethod
-    def process_pdf(pdf_path: str) -> List[Dict[str, Any]]:
+    def process_pdf(pdf_path: str, page_numbers: Optional[List[int]] = None) -> List[Dict[str, Any]]:
         if not OCR_AVAILABLE:
-            logger.warning("OCR is not available. Tesseract is not installed or not in PATH.")
-            return [{
-                "page_num": 1,
-                "text": "OCR processing not available. Text extraction skipped."
-            }]
+            raise RuntimeError("OCR is not available. Tesseract is not installed or not in PATH.")
         try:
-            pages = convert_from_path(pdf_path)
+            if page_numbers is None:
+                page_count = pdfinfo_from_path(pdf_path)["Pages"]
+                page_numbers = list(range(1, page_count + 1))
+
+            pool = OCRService.get_pool()
+            futures = [pool.submit(ocr_pdf_page, pdf_path, page_num, OCR_DPI) for page_num in page_numbers]
+
             result = []
-            for i, page in enumerate(pages):
-                text = pytesseract.image_to_string(page)
-                result.append({
-                    "page_num": i + 1,
-                    "text": text
-                })
+            for page_num, future in zip(page_numbers, futures):
+                page = {"page_num": page_num, "text": ""}
+                try:
+                    page["text"] = future.result()
+                except Exception as page_error:
+                    logger.error(f"Error running OCR on page {page_num} of {pdf_path}: {str(page_error)}")
+                    page["ocr_error"] = str(page_error)
+                result.append(page)
+            logger.info(f"OCR processed {len(result)} pages of {pdf_path} with {OCR_WORKERS} workers")
             return result
         except Exception as e:
             logger.error(f"Error processing PDF with OCR: {str(e)}")
-            return [{
-                "page_num": 1,
-                "text": f"Error during OCR processing: {str(e)}"
-            }]
-
-    @staticmethod
-    def is_scanned_document(pdf_path: str) -> bool:
-        if not OCR_AVAILABLE:
-            logger.warning("OCR is not available. Tesseract is not installed or not in PATH.")
-            return False
-        try:
-            pages = convert_from_path(pdf_path, first_page=1, last_page=1)
-            if not pages:
-                return False
-            text = pytesseract.image_to_string(pages[0])
-            return len(text.strip()) < 100
-        except Exception as e:
-            logger.error(f"Error checking if document is scanned: {str(e)}")
-            return False
+            raise
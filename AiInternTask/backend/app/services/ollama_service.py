@@ -1,280 +1,340 @@
+import asyncio
 import logging
 import json
-import requests
-import hashlib
-from typing import Dict, Any, List, Optional
-from ..config import OLLAMA_API_URL, OLLAMA_MODEL
+from typing import Dict, Any, List, Optional, Callable, Tuple, Union
+from ..config import OLLAMA_API_URL, OLLAMA_MODEL, OLLAMA_NUM_CTX, ANSWER_MAX_TOKENS, THEMES_MAX_TOKENS
+from ..core.http_client import get_ollama_session, ollama_timeout, async_post_with_retry, HTTPX_AVAILABLE
+from .cache_service import ResponseCache, create_response_cache
+from .health_service import OllamaHealthService
+from .prompt_budget_service import PromptBudgetService
 
 logger = logging.getLogger(__name__)
 
-RESPONSE_CACHE = {}
+RESPONSE_CACHE = create_response_cache()
 
 class OllamaService:
     @staticmethod
     def is_available() -> bool:
-        try:
-            try:
-                response = requests.get(f"{OLLAMA_API_URL.rstrip('/api')}/version", timeout=5)
-                if response.status_code == 200:
-                    logger.info(f"Ollama is available at {OLLAMA_API_URL.rstrip('/api')}/version")
-                    return True
-            except Exception as e:
-                logger.warning(f"Could not connect to Ollama version endpoint: {str(e)}")
-
-            try:
-                response = requests.get(f"{OLLAMA_API_URL}/tags", timeout=5)
-                if response.status_code == 200:
-                    models = response.json().get("models", [])
-                    model_names = [model.get("name", "").split(":")[0] for model in models]
-
-                    logger.info(f"Available Ollama models: {model_names}")
-
-                    if OLLAMA_MODEL in model_names or any(model.startswith(OLLAMA_MODEL) for model in model_names):
-                        logger.info(f"Ollama model {OLLAMA_MODEL} is available")
-                        return True
-                    else:
-                        logger.warning(f"Ollama is available but model {OLLAMA_MODEL} is not found. Available models: {model_names}")
-                        return False
-
-                logger.info(f"Ollama is available at {OLLAMA_API_URL}")
-                return True
-            except Exception as e:
-                logger.warning(f"Could not connect to Ollama API endpoint: {str(e)}")
-
-            return False
-        except Exception as e:
-            logger.error(f"Error checking Ollama availability: {str(e)}")
-            return False
+        return OllamaHealthService.is_available()
 
     @staticmethod
-    def generate_response(prompt: str, system_message: Optional[str] = None, max_tokens: int = 1000) -> Optional[str]:
-        try:
-            headers = {
-                "Content-Type": "application/json"
-            }
-
-            data = {
-                "model": OLLAMA_MODEL,
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "num_predict": max_tokens
-                }
-            }
+    def generate_response(
+        prompt: str,
+        system_message: Optional[str] = None,
+        max_tokens: int = 1000,
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Optional[str]:
+        if not OllamaHealthService.allow_request():
+            logger.warning("Ollama circuit is open. Skipping generate request.")
+            return None
 
-            if system_message:
-                data["system"] = system_message
+        try:
+            data = OllamaService.build_generate_payload(prompt, system_message, max_tokens)
+            if on_token:
+                data["stream"] = True
 
-            response = requests.post(
+            response = get_ollama_session().post(
                 f"{OLLAMA_API_URL}/generate",
-                headers=headers,
                 json=data,
-                timeout=30
+                timeout=ollama_timeout(),
+                stream=bool(on_token)
             )
 
+            if response.status_code >= 500:
+                OllamaHealthService.record_failure()
+            else:
+                OllamaHealthService.record_success()
+
             if response.status_code != 200:
                 logger.error(f"Ollama API error: {response.status_code} - {response.text}")
                 return None
 
+            if on_token:
+                return OllamaService.read_stream(response, on_token)
+
             response_data = response.json()
             return response_data.get("response", "")
 
         except Exception as e:
+            OllamaHealthService.record_failure()
             logger.error(f"Error calling Ollama API: {str(e)}")
             return None
 
     @staticmethod
-    def extract_answer_from_document(document_text: str, query: str) -> Dict[str, Any]:
-        if not OllamaService.is_available():
-            logger.warning("Ollama API not available. Make sure Ollama is installed and running.")
-            return {
-                "extracted_answer": "Unable to extract answer: Ollama API not available",
-                "citations": []
-            }
+    def read_stream(response, on_token: Callable[[str], None]) -> str:
+        parts = []
+        with response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                token = chunk.get("response", "")
+                if token:
+                    parts.append(token)
+                    on_token(token)
+                if chunk.get("done"):
+                    break
+        return "".join(parts)
+
+    @staticmethod
+    async def agenerate_response(prompt: str, system_message: Optional[str] = None, max_tokens: int = 1000) -> Optional[str]:
+        if not HTTPX_AVAILABLE:
+            return await asyncio.to_thread(OllamaService.generate_response, prompt, system_message, max_tokens)
+
+        if not OllamaHealthService.allow_request():
+            logger.warning("Ollama circuit is open. Skipping generate request.")
+            return None
 
         try:
-            system_message = """
-            You are a document analysis assistant. Your task is to:
-            1. Extract relevant information from the document text that answers the query
-            2. Provide a concise answer based on the document content
-            3. Include citations with page numbers, paragraphs, and relevant sentences
-            4. Only use information from the provided document
-            5. If the document doesn't contain relevant information, state that clearly
-
-            Format your response as JSON with the following structure:
-            {
-                "extracted_answer": "The concise answer based on the document",
-                "citations": [
-                    {
-                        "page_number": 1,
-                        "paragraph": 2,
-                        "sentence": "The exact sentence from the document that supports the answer",
-                        "relevance_score": 0.95
-                    }
-                ]
-            }
-            """
+            # Sizing num_predict runs the tokenizer, so it stays off the event loop.
+            data = await asyncio.to_thread(OllamaService.build_generate_payload, prompt, system_message, max_tokens)
 
-            max_chars = 4000
-            if len(document_text) > max_chars:
-                truncated_text = document_text[:max_chars] + "... [text truncated]"
-                logger.info(f"Document text truncated from {len(document_text)} to {max_chars} characters")
+            response = await async_post_with_retry(f"{OLLAMA_API_URL}/generate", data)
+
+            if response.status_code >= 500:
+                OllamaHealthService.record_failure()
             else:
-                truncated_text = document_text
+                OllamaHealthService.record_success()
 
-            prompt = f"Query: {query}\n\nDocument Text:\n{truncated_text}"
+            if response.status_code != 200:
+                logger.error(f"Ollama API error: {response.status_code} - {response.text}")
+                return None
 
-            cache_key = hashlib.md5((prompt + (system_message or "")).encode()).hexdigest()
+            return response.json().get("response", "")
 
-            if cache_key in RESPONSE_CACHE:
-                logger.info(f"Using cached response for query: {query[:30]}...")
-                response = RESPONSE_CACHE[cache_key]
-            else:
-                response = OllamaService.generate_response(prompt, system_message, max_tokens=2000)
-                if response:
-                    RESPONSE_CACHE[cache_key] = response
-                    if len(RESPONSE_CACHE) > 100:
-                        RESPONSE_CACHE.pop(next(iter(RESPONSE_CACHE)))
+        except Exception as e:
+            OllamaHealthService.record_failure()
+            logger.error(f"Error calling Ollama API: {str(e)}")
+            return None
 
-            if not response:
-                return {
-                    "extracted_answer": "Unable to extract answer due to API error",
-                    "citations": []
+    @staticmethod
+    def build_generate_payload(prompt: str, system_message: Optional[str] = None, max_tokens: int = 1000) -> Dict[str, Any]:
+        data = {
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": False,
+            # The prompt was packed to leave max_tokens free, and num_predict is capped
+            # again here so prompt and answer together never exceed the context window.
+            "options": {
+                "num_ctx": OLLAMA_NUM_CTX,
+                "num_predict": PromptBudgetService.num_predict(prompt, system_message, max_tokens)
+            }
+        }
+
+        if system_message:
+            data["system"] = system_message
+        return data
+
+    @staticmethod
+    def prepare_cached_request(
+        build_prompt: Callable[..., Tuple[str, str]],
+        max_tokens: int,
+        *prompt_args: Any
+    ) -> Tuple[str, str, str, Optional[str]]:
+        # Builds the prompt and looks it up in the response cache. The async paths run this
+        # in a thread, since prompt packing tokenizes and the sqlite cache reads from disk.
+        prompt, system_message = build_prompt(*prompt_args)
+        cache_key = ResponseCache.make_key(OLLAMA_MODEL, prompt, system_message, max_tokens)
+        return prompt, system_message, cache_key, RESPONSE_CACHE.get(cache_key)
+
+    @staticmethod
+    def build_answer_prompt(context: Union[str, List[str]], query: str) -> Tuple[str, str]:
+        system_message = """
+        You are a document analysis assistant. Your task is to:
+        1. Extract relevant information from the document text that answers the query
+        2. Provide a concise answer based on the document content
+        3. Include citations with page numbers, paragraphs, and relevant sentences
+        4. Only use information from the provided document
+        5. If the document doesn't contain relevant information, state that clearly
+
+        Format your response as JSON with the following structure:
+        {
+            "extracted_answer": "The concise answer based on the document",
+            "citations": [
+                {
+                    "page_number": 1,
+                    "paragraph": 2,
+                    "sentence": "The exact sentence from the document that supports the answer",
+                    "relevance_score": 0.95
                 }
+            ]
+        }
+        """
 
-            try:
-                json_start = response.find('{')
-                json_end = response.rfind('}') + 1
+        # Passages arrive best first and are packed until the model's context is full.
+        sections = [context] if isinstance(context, str) else context
+        header = f"Query: {query}\n\nDocument Text:\n"
+        token_budget = PromptBudgetService.context_budget(ANSWER_MAX_TOKENS, system_message, header)
+        prompt = header + PromptBudgetService.pack(sections, token_budget)
 
-                if json_start >= 0 and json_end > json_start:
-                    json_str = response[json_start:json_end]
-                    result = json.loads(json_str)
+        return prompt, system_message
 
-                    # Validate the structure
-                    if "extracted_answer" not in result:
-                        result["extracted_answer"] = "Answer extraction failed: Invalid response format"
+    @staticmethod
+    def parse_answer(response: Optional[str]) -> Dict[str, Any]:
+        if not response:
+            return {
+                "extracted_answer": "Unable to extract answer due to API error",
+                "citations": []
+            }
+
+        try:
+            json_start = response.find('{')
+            json_end = response.rfind('}') + 1
 
-                    if "citations" not in result or not isinstance(result["citations"], list):
-                        result["citations"] = []
+            if json_start >= 0 and json_end > json_start:
+                json_str = response[json_start:json_end]
+                result = json.loads(json_str)
 
-                    return result
-                else:
-                    return {
-                        "extracted_answer": response,
-                        "citations": []
-                    }
+                # Validate the structure
+                if "extracted_answer" not in result:
+                    result["extracted_answer"] = "Answer extraction failed: Invalid response format"
 
-            except json.JSONDecodeError:
+                if "citations" not in result or not isinstance(result["citations"], list):
+                    result["citations"] = []
+
+                return result
+            else:
                 return {
                     "extracted_answer": response,
                     "citations": []
                 }
 
-        except Exception as e:
-            logger.error(f"Error extracting answer: {str(e)}")
+        except json.JSONDecodeError:
             return {
-                "extracted_answer": f"Error extracting answer: {str(e)}",
+                "extracted_answer": response,
                 "citations": []
             }
 
     @staticmethod
-    def identify_themes(document_responses: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    def extract_answer_from_document(
+        context: Union[str, List[str]],
+        query: str,
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, Any]:
         if not OllamaService.is_available():
             logger.warning("Ollama API not available. Make sure Ollama is installed and running.")
-            return [{
-                "theme_name": "Theme Identification Unavailable",
-                "description": "Theme identification is unavailable because Ollama API is not available.",
-                "document_ids": [],
-                "supporting_evidence": ["Please make sure Ollama is installed and running to enable theme identification."]
-            }]
+            return {
+                "extracted_answer": "Unable to extract answer: Ollama API not available",
+                "citations": []
+            }
 
         try:
-            document_responses_text = ""
-            for i, doc_response in enumerate(document_responses):
-                document_responses_text += f"Document {i+1} (ID: {doc_response['document_id']}, Title: {doc_response['document_title']}):\n"
-                document_responses_text += f"Answer: {doc_response['extracted_answer']}\n\n"
-
-            system_message = """
-            You are a research assistant that identifies themes in document responses.
-            Analyze the document responses to a query and identify meaningful themes.
-
-            If there are multiple documents, identify common themes across them.
-            If there is only one document, identify the main themes within that document.
-
-            For each theme:
-            1. Provide a clear theme name
-            2. Write a concise description of the theme
-            3. List the document IDs that support this theme
-            4. Include supporting evidence from the documents
-
-            Format your response as JSON with the following structure:
-            [
-                {
-                    "theme_name": "Name of Theme 1",
-                    "description": "Description of Theme 1",
-                    "document_ids": ["doc1", "doc2"],
-                    "supporting_evidence": ["Evidence 1", "Evidence 2"]
-                }
-            ]
+            prompt, system_message = OllamaService.build_answer_prompt(context, query)
 
-            Identify at least 2-3 themes if possible, but only include genuinely meaningful themes.
-            """
+            cache_key = ResponseCache.make_key(OLLAMA_MODEL, prompt, system_message, ANSWER_MAX_TOKENS)
 
-            max_chars = 3000
-            if len(document_responses_text) > max_chars:
-                truncated_text = document_responses_text[:max_chars] + "... [text truncated]"
-                logger.info(f"Document responses text truncated from {len(document_responses_text)} to {max_chars} characters")
+            response = RESPONSE_CACHE.get(cache_key)
+            if response is not None:
+                logger.info(f"Using cached response for query: {query[:30]}...")
             else:
-                truncated_text = document_responses_text
+                response = OllamaService.generate_response(prompt, system_message, max_tokens=ANSWER_MAX_TOKENS, on_token=on_token)
+                if response:
+                    RESPONSE_CACHE.set(cache_key, response)
 
-            prompt = f"Query: {query}\n\nDocument Responses:\n\n{truncated_text}"
+            return OllamaService.parse_answer(response)
 
-            cache_key = hashlib.md5((prompt + (system_message or "")).encode()).hexdigest()
+        except Exception as e:
+            logger.error(f"Error extracting answer: {str(e)}")
+            return {
+                "extracted_answer": f"Error extracting answer: {str(e)}",
+                "citations": []
+            }
 
-            if cache_key in RESPONSE_CACHE:
-                logger.info(f"Using cached theme response for query: {query[:30]}...")
-                response = RESPONSE_CACHE[cache_key]
+    @staticmethod
+    async def aextract_answer_from_document(context: Union[str, List[str]], query: str) -> Dict[str, Any]:
+        # Availability is checked by the caller; the circuit breaker still guards the request.
+        try:
+            prompt, system_message, cache_key, response = await asyncio.to_thread(
+                OllamaService.prepare_cached_request,
+                OllamaService.build_answer_prompt,
+                ANSWER_MAX_TOKENS,
+                context,
+                query
+            )
+            if response is not None:
+                logger.info(f"Using cached response for query: {query[:30]}...")
             else:
-                response = OllamaService.generate_response(prompt, system_message, max_tokens=3000)
+                response = await OllamaService.agenerate_response(prompt, system_message, max_tokens=ANSWER_MAX_TOKENS)
                 if response:
-                    RESPONSE_CACHE[cache_key] = response
-                    if len(RESPONSE_CACHE) > 100:
-                        RESPONSE_CACHE.pop(next(iter(RESPONSE_CACHE)))
+                    await asyncio.to_thread(RESPONSE_CACHE.set, cache_key, response)
 
-            if not response:
-                return [{
-                    "theme_name": "Theme Identification Error",
-                    "description": "An error occurred during theme identification.",
-                    "document_ids": [],
-                    "supporting_evidence": ["Please check that Ollama is running correctly."]
-                }]
+            return OllamaService.parse_answer(response)
+
+        except Exception as e:
+            logger.error(f"Error extracting answer: {str(e)}")
+            return {
+                "extracted_answer": f"Error extracting answer: {str(e)}",
+                "citations": []
+            }
 
-            try:
-                json_start = response.find('[')
-                json_end = response.rfind(']') + 1
+    @staticmethod
+    def build_themes_prompt(document_responses: List[Dict[str, Any]], query: str) -> Tuple[str, str]:
+        sections = [
+            f"Document {i+1} (ID: {doc_response['document_id']}, Title: {doc_response['document_title']}):\n"
+            f"Answer: {doc_response['extracted_answer']}"
+            for i, doc_response in enumerate(document_responses)
+        ]
+
+        system_message = """
+        You are a research assistant that identifies themes in document responses.
+        Analyze the document responses to a query and identify meaningful themes.
+
+        If there are multiple documents, identify common themes across them.
+        If there is only one document, identify the main themes within that document.
+
+        For each theme:
+        1. Provide a clear theme name
+        2. Write a concise description of the theme
+        3. List the document IDs that support this theme
+        4. Include supporting evidence from the documents
+
+        Format your response as JSON with the following structure:
+        [
+            {
+                "theme_name": "Name of Theme 1",
+                "description": "Description of Theme 1",
+                "document_ids": ["doc1", "doc2"],
+                "supporting_evidence": ["Evidence 1", "Evidence 2"]
+            }
+        ]
 
-                if json_start >= 0 and json_end > json_start:
-                    json_str = response[json_start:json_end]
-                    themes = json.loads(json_str)
+        Identify at least 2-3 themes if possible, but only include genuinely meaningful themes.
+        """
 
-                    if not isinstance(themes, list):
-                        return [{
-                            "theme_name": "Theme Identification Error",
-                            "description": "Invalid response format from Ollama API.",
-                            "document_ids": [],
-                            "supporting_evidence": ["The API response was not in the expected format."]
-                        }]
+        header = f"Query: {query}\n\nDocument Responses:\n\n"
+        token_budget = PromptBudgetService.context_budget(THEMES_MAX_TOKENS, system_message, header)
+        prompt = header + PromptBudgetService.pack(sections, token_budget)
 
-                    return themes
-                else:
+        return prompt, system_message
+
+    @staticmethod
+    def parse_themes(response: Optional[str]) -> List[Dict[str, Any]]:
+        if not response:
+            return [{
+                "theme_name": "Theme Identification Error",
+                "description": "An error occurred during theme identification.",
+                "document_ids": [],
+                "supporting_evidence": ["Please check that Ollama is running correctly."]
+            }]
+
+        try:
+            json_start = response.find('[')
+            json_end = response.rfind(']') + 1
+
+            if json_start >= 0 and json_end > json_start:
+                json_str = response[json_start:json_end]
+                themes = json.loads(json_str)
+
+                if not isinstance(themes, list):
                     return [{
                         "theme_name": "Theme Identification Error",
-                        "description": "Could not parse themes from Ollama API response.",
+                        "description": "Invalid response format from Ollama API.",
                         "document_ids": [],
-                        "supporting_evidence": ["The API response did not contain valid JSON."]
+                        "supporting_evidence": ["The API response was not in the expected format."]
                     }]
 
-            except json.JSONDecodeError:
+                return themes
+            else:
                 return [{
                     "theme_name": "Theme Identification Error",
                     "description": "Could not parse themes from Ollama API response.",
@@ -282,6 +342,68 @@ class OllamaService:
                     "supporting_evidence": ["The API response did not contain valid JSON."]
                 }]
 
+        except json.JSONDecodeError:
+            return [{
+                "theme_name": "Theme Identification Error",
+                "description": "Could not parse themes from Ollama API response.",
+                "document_ids": [],
+                "supporting_evidence": ["The API response did not contain valid JSON."]
+            }]
+
+    @staticmethod
+    def identify_themes(document_responses: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+        if not OllamaService.is_available():
+            logger.warning("Ollama API not available. Make sure Ollama is installed and running.")
+            return [{
+                "theme_name": "Theme Identification Unavailable",
+                "description": "Theme identification is unavailable because Ollama API is not available.",
+                "document_ids": [],
+                "supporting_evidence": ["Please make sure Ollama is installed and running to enable theme identification."]
+            }]
+
+        try:
+            prompt, system_message = OllamaService.build_themes_prompt(document_responses, query)
+
+            cache_key = ResponseCache.make_key(OLLAMA_MODEL, prompt, system_message, THEMES_MAX_TOKENS)
+
+            response = RESPONSE_CACHE.get(cache_key)
+            if response is not None:
+                logger.info(f"Using cached theme response for query: {query[:30]}...")
+            else:
+                response = OllamaService.generate_response(prompt, system_message, max_tokens=THEMES_MAX_TOKENS)
+                if response:
+                    RESPONSE_CACHE.set(cache_key, response)
+
+            return OllamaService.parse_themes(response)
+
+        except Exception as e:
+            logger.error(f"Error identifying themes: {str(e)}")
+            return [{
+                "theme_name": "Theme Identification Error",
+                "description": f"An error occurred during theme identification: {str(e)}",
+                "document_ids": [],
+                "supporting_evidence": ["Please check that Ollama is running correctly."]
+            }]
+
+    @staticmethod
+    async def aidentify_themes(document_responses: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+        try:
+            prompt, system_message, cache_key, response = await asyncio.to_thread(
+                OllamaService.prepare_cached_request,
+                OllamaService.build_themes_prompt,
+                THEMES_MAX_TOKENS,
+                document_responses,
+                query
+            )
+            if response is not None:
+                logger.info(f"Using cached theme response for query: {query[:30]}...")
+            else:
+                response = await OllamaService.agenerate_response(prompt, system_message, max_tokens=THEMES_MAX_TOKENS)
+                if response:
+                    await asyncio.to_thread(RESPONSE_CACHE.set, cache_key, response)
+
+            return OllamaService.parse_themes(response)
+
         except Exception as e:
             logger.error(f"Error identifying themes: {str(e)}")
             return [{
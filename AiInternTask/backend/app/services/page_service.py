@@ -0,0 +1,107 @@
+import logging
+from typing import Dict, List, Optional
+from pymongo import ReplaceOne, UpdateOne
+from ..models.document import DocumentPage
+from ..core.database import get_documents_collection, get_pages_collection
+
+logger = logging.getLogger(__name__)
+
+class PageService:
+
+    @staticmethod
+    def save_pages(document_id: str, pages: List[DocumentPage]) -> None:
+        PageService.save_pages_for_documents({document_id: pages})
+
+    @staticmethod
+    def save_pages_for_documents(pages_by_document: Dict[str, List[DocumentPage]]) -> None:
+        if get_pages_collection() is None:
+            logger.warning("MongoDB pages collection is not initialized")
+            return
+        if not pages_by_document:
+            return
+
+        operations = [
+            ReplaceOne(
+                {"document_id": document_id, "page_num": page.page_num},
+                {"document_id": document_id, **page.model_dump()},
+                upsert=True
+            )
+            for document_id, pages in pages_by_document.items()
+            for page in pages
+        ]
+        if operations:
+            get_pages_collection().bulk_write(operations, ordered=False)
+        get_pages_collection().delete_many({"$or": [
+            {"document_id": document_id, "page_num": {"$nin": [page.page_num for page in pages]}}
+            for document_id, pages in pages_by_document.items()
+        ]})
+
+    @staticmethod
+    def get_pages(document_id: str, page_numbers: Optional[List[int]] = None) -> List[DocumentPage]:
+        if get_pages_collection() is None:
+            logger.warning("MongoDB pages collection is not initialized")
+            return []
+
+        query = {"document_id": document_id}
+        if page_numbers is not None:
+            query["page_num"] = {"$in": list(page_numbers)}
+        records = list(get_pages_collection().find(query, {"_id": 0, "document_id": 0}).sort("page_num", 1))
+        if records:
+            return [DocumentPage(**record) for record in records]
+
+        # Documents stored before the pages collection existed keep their pages inline
+        # until the split_pages migration has been run.
+        doc_data = get_documents_collection().find_one({"_id": document_id}, {"pages": 1})
+        if not doc_data:
+            return []
+        pages = [DocumentPage(**page) for page in doc_data.get("pages", [])]
+        if page_numbers is not None:
+            wanted = set(page_numbers)
+            pages = [page for page in pages if page.page_num in wanted]
+        return pages
+
+    @staticmethod
+    def set_embedding_ids(document_id: str, embedding_ids: Dict[int, List[str]]) -> None:
+        if get_pages_collection() is None or not embedding_ids:
+            return
+        # Pages stored before chunking kept a single page-level id that no vector has any more.
+        get_pages_collection().bulk_write([
+            UpdateOne(
+                {"document_id": document_id, "page_num": page_num},
+                {"$set": {"embedding_ids": page_embedding_ids}, "$unset": {"embedding_id": ""}}
+            )
+            for page_num, page_embedding_ids in embedding_ids.items()
+        ], ordered=False)
+
+    @staticmethod
+    def delete_pages(document_id: str) -> None:
+        if get_pages_collection() is None:
+            return
+        get_pages_collection().delete_many({"document_id": document_id})
+
+    @staticmethod
+    def migrate_document(document_id: str) -> int:
+        doc_data = get_documents_collection().find_one({"_id": document_id}, {"pages": 1})
+        inline_pages = (doc_data or {}).get("pages") or []
+        if not inline_pages:
+            return 0
+
+        PageService.save_pages(document_id, [DocumentPage(**page) for page in inline_pages])
+        get_documents_collection().update_one({"_id": document_id}, {"$set": {"pages": []}})
+        return len(inline_pages)
+
+    @staticmethod
+    def migrate_all() -> int:
+        if get_documents_collection() is None or get_pages_collection() is None:
+            raise RuntimeError("MongoDB not initialized. Call initialize_mongodb() first.")
+
+        migrated = 0
+        cursor = get_documents_collection().find({"pages.0": {"$exists": True}}, {"_id": 1})
+        for doc_data in cursor:
+            try:
+                page_count = PageService.migrate_document(doc_data["_id"])
+                migrated += 1
+                logger.info(f"Moved {page_count} pages of document {doc_data['_id']} to the pages collection")
+            except Exception as e:
+                logger.error(f"Error migrating pages of document {doc_data['_id']}: {str(e)}")
+        return migrated
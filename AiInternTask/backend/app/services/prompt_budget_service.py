@@ -0,0 +1,96 @@
+import importlib.util
+import logging
+import threading
+from typing import List, Optional
+from ..config import OLLAMA_NUM_CTX, OLLAMA_TOKENIZER
+
+logger = logging.getLogger(__name__)
+
+TRANSFORMERS_AVAILABLE = importlib.util.find_spec("transformers") is not None
+
+CHARS_PER_TOKEN = 4
+# Room for the chat template Ollama wraps around the system message and prompt
+PROMPT_TEMPLATE_TOKENS = 32
+TRUNCATION_MARKER = "... [text truncated]"
+
+class PromptBudgetService:
+    _tokenizer = None
+    _tokenizer_state = "not loaded"
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_tokenizer():
+        if PromptBudgetService._tokenizer_state != "not loaded":
+            return PromptBudgetService._tokenizer
+
+        with PromptBudgetService._lock:
+            if PromptBudgetService._tokenizer_state == "not loaded":
+                if not OLLAMA_TOKENIZER or not TRANSFORMERS_AVAILABLE:
+                    PromptBudgetService._tokenizer_state = "unavailable"
+                else:
+                    try:
+                        from transformers import AutoTokenizer
+                        PromptBudgetService._tokenizer = AutoTokenizer.from_pretrained(OLLAMA_TOKENIZER)
+                        PromptBudgetService._tokenizer_state = "loaded"
+                        logger.info(f"Counting prompt tokens with the {OLLAMA_TOKENIZER} tokenizer")
+                    except Exception as e:
+                        PromptBudgetService._tokenizer_state = "failed"
+                        logger.error(f"Error loading tokenizer {OLLAMA_TOKENIZER}, estimating tokens instead: {str(e)}")
+        return PromptBudgetService._tokenizer
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        tokenizer = PromptBudgetService.get_tokenizer()
+        if tokenizer is None:
+            return PromptBudgetService.estimate_tokens(text)
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    @staticmethod
+    def context_budget(max_tokens: int, *fixed_parts: Optional[str]) -> int:
+        # Tokens left for document text once the answer and the fixed parts of the prompt are reserved.
+        reserved = max_tokens + PROMPT_TEMPLATE_TOKENS
+        reserved += sum(PromptBudgetService.count_tokens(part) for part in fixed_parts if part)
+        if PromptBudgetService.get_tokenizer() is None:
+            # Estimates can be off, and Ollama drops the start of a prompt that does not fit.
+            reserved += OLLAMA_NUM_CTX // 10
+        return max(0, OLLAMA_NUM_CTX - reserved)
+
+    @staticmethod
+    def num_predict(prompt: str, system_message: Optional[str], max_tokens: int) -> int:
+        prompt_tokens = PromptBudgetService.count_tokens(prompt) + PROMPT_TEMPLATE_TOKENS
+        if system_message:
+            prompt_tokens += PromptBudgetService.count_tokens(system_message)
+        return max(1, min(max_tokens, OLLAMA_NUM_CTX - prompt_tokens))
+
+    @staticmethod
+    def truncate(text: str, max_tokens: int) -> str:
+        max_tokens = max(0, max_tokens)
+        tokenizer = PromptBudgetService.get_tokenizer()
+        if tokenizer is None:
+            return text[:max_tokens * CHARS_PER_TOKEN] + TRUNCATION_MARKER
+        token_ids = tokenizer.encode(text, add_special_tokens=False)
+        return tokenizer.decode(token_ids[:max_tokens]) + TRUNCATION_MARKER
+
+    @staticmethod
+    def pack(sections: List[str], token_budget: int, separator: str = "\n\n") -> str:
+        # Sections come best first. Whole sections are kept while they fit, and a section
+        # that does not fit is skipped so a shorter one further down can still be used.
+        packed = []
+        used_tokens = 0
+        separator_tokens = PromptBudgetService.count_tokens(separator)
+        for section in sections:
+            section_tokens = PromptBudgetService.count_tokens(section) + (separator_tokens if packed else 0)
+            if used_tokens + section_tokens <= token_budget:
+                packed.append(section)
+                used_tokens += section_tokens
+
+        if not packed and sections and token_budget > 0:
+            packed.append(PromptBudgetService.truncate(sections[0], token_budget - PromptBudgetService.count_tokens(TRUNCATION_MARKER)))
+            used_tokens = token_budget
+        if len(packed) < len(sections):
+            logger.info(f"Packed {len(packed)} of {len(sections)} sections into {used_tokens} of {token_budget} prompt tokens")
+        return separator.join(packed)
@@ -1,12 +1,34 @@
+import asyncio
 import logging
 import uuid
 import os
-from typing import Optional, List, Dict, Any
-from ..models.query import Query, QueryCreate, DocumentResponse, DocumentCitation
+import time
+import queue
+import threading
+import pymongo
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Any, Tuple, Callable, Iterator
+from ..models.query import Query, QueryCreate, QueryFilters, DocumentResponse, DocumentCitation, QuerySearchResult, SearchDocumentResult, SearchPassage
 from ..models.document import Document
-from ..core.database import queries_collection, documents_collection
+from ..core.database import get_queries_collection, get_documents_collection, get_async_queries_collection, get_async_documents_collection
 from .vector_service import VectorService
+from .search_service import SearchService
+from .lexical_service import LexicalIndexService
 from .ollama_service import OllamaService
+from .page_service import PageService
+from .prompt_budget_service import PromptBudgetService
+from ..config import (
+    QUERY_CONTEXT_MODE,
+    PASSAGES_PER_DOCUMENT,
+    PASSAGE_TOKEN_BUDGET,
+    RETRIEVAL_CANDIDATES,
+    RETRIEVAL_MODE,
+    MAX_QUERY_DOCUMENTS,
+    QUERY_FALLBACK,
+    QUERY_FALLBACK_LIMIT,
+    QUERY_MAX_CONCURRENCY,
+    QUERY_DOCUMENT_TIMEOUT,
+)
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
@@ -18,102 +40,381 @@ class QueryService:
         try:
             query_id = str(uuid.uuid4())
 
-            try:
-                similar_docs = VectorService.search_similar_documents(query_create.text, top_k=10)
-
-                document_ids = list(set([doc["document_id"] for doc in similar_docs]))
+            document_ids, passages_by_document, query_embedding, fallback = QueryService.retrieve_documents(query_create.text, query_create)
 
-                if document_ids:
-                    logger.info(f"Vector search found {len(document_ids)} relevant documents")
-                else:
-                    logger.warning("No documents found via vector search. Falling back to all documents.")
-            except Exception as vector_error:
-                logger.error(f"Error during vector search: {str(vector_error)}. Falling back to all documents.")
-                document_ids = []
-
-            if not document_ids:
-                try:
-                    all_docs = list(documents_collection.find())
-                    document_ids = [str(doc["_id"]) for doc in all_docs]
-                    logger.info(f"Using all {len(document_ids)} documents")
-                except Exception as db_error:
-                    logger.error(f"Error getting documents: {str(db_error)}")
-                    document_ids = []
-
-            document_responses = []
-            for doc_id in document_ids:
-                try:
-                    doc_data = documents_collection.find_one({"_id": doc_id})
-                    if not doc_data:
-                        logger.warning(f"Document {doc_id} not found in MongoDB")
-                        continue
-
-                    document = Document(**doc_data)
-
-                    document_text = "\n\n".join([f"Page {page.page_num}:\n{page.text}" for page in document.pages])
-
-                    if OllamaService.is_available():
-                        result = OllamaService.extract_answer_from_document(document_text, query_create.text)
-                    else:
-                        logger.warning("Ollama is not available. Using simple text extraction.")
-                        result = {
-                            "extracted_answer": f"Ollama is not available. Here's a preview of the document:\n\n{document_text[:500]}...",
-                            "citations": []
-                        }
-
-                    citations = []
-                    for citation in result.get("citations", []):
-                        citations.append(DocumentCitation(
-                            document_id=doc_id,
-                            document_title=document.title,
-                            page_number=citation.get("page_number"),
-                            paragraph=citation.get("paragraph"),
-                            sentence=citation.get("sentence"),
-                            relevance_score=citation.get("relevance_score", 0.5)
-                        ))
-
-                    document_responses.append(DocumentResponse(
-                        document_id=doc_id,
-                        document_title=document.title,
-                        extracted_answer=result.get("extracted_answer", "No answer extracted"),
-                        citations=citations
-                    ))
-
-                except Exception as doc_error:
-                    logger.error(f"Error processing document {doc_id}: {str(doc_error)}")
-                    document_responses.append(DocumentResponse(
-                        document_id=doc_id,
-                        document_title=f"Document {doc_id}",
-                        extracted_answer=f"Error processing document: {str(doc_error)}",
-                        citations=[]
-                    ))
+            document_responses = QueryService.answer_documents(
+                document_ids,
+                query_create.text,
+                passages_by_document,
+                query_embedding
+            )
 
             query = Query(
                 id=query_id,
                 text=query_create.text,
                 document_responses=document_responses,
-                themes=[]
+                themes=[],
+                partial=fallback is not None,
+                fallback=fallback
             )
 
-            query_dict = query.model_dump(by_alias=True)
-            query_dict['_id'] = query_id
-            queries_collection.insert_one(query_dict)
+            QueryService.save_query(query)
 
             return query
         except Exception as e:
             logger.error(f"Error creating query: {str(e)}")
             raise
 
+    @staticmethod
+    def retrieve_documents(
+        query_text: str,
+        filters: Optional[QueryFilters] = None
+    ) -> Tuple[List[str], Dict[str, List[Dict[str, Any]]], Optional[List[float]], Optional[str]]:
+        passages_by_document = {}
+
+        query_embedding = None
+        try:
+            query_embedding = VectorService.embed_query(query_text)
+        except Exception as embed_error:
+            logger.error(f"Error embedding query: {str(embed_error)}")
+
+        keyword_searched = False
+        try:
+            hits = SearchService.search(query_text, top_k=RETRIEVAL_CANDIDATES, query_embedding=query_embedding, filters=filters)
+            keyword_searched = RETRIEVAL_MODE == "hybrid"
+            ranked_documents = SearchService.rank_documents(hits)
+
+            document_ids = []
+            for ranked in ranked_documents:
+                document_ids.append(ranked["document_id"])
+                passages_by_document[ranked["document_id"]] = ranked["hits"]
+
+            if document_ids:
+                logger.info(f"Search found {len(document_ids)} relevant documents")
+            else:
+                logger.warning("No documents found via search. Using the fallback documents.")
+        except Exception as vector_error:
+            logger.error(f"Error during search: {str(vector_error)}. Using the fallback documents.")
+            document_ids = []
+
+        fallback = None
+        if not document_ids:
+            document_ids, passages_by_document, fallback = QueryService.fallback_documents(query_text, filters, keyword_searched)
+
+        return document_ids, passages_by_document, query_embedding, fallback
+
+    @staticmethod
+    def search_queries(
+        queries: List[str],
+        max_documents: int = MAX_QUERY_DOCUMENTS,
+        filters: Optional[QueryFilters] = None
+    ) -> List[QuerySearchResult]:
+        # Retrieval only: the queries are embedded together and sent to Chroma in one call.
+        hits_by_query = SearchService.search_many(queries, top_k=RETRIEVAL_CANDIDATES, filters=filters)
+        ranked_by_query = [
+            SearchService.rank_documents(hits, max_documents=max_documents)
+            for hits in hits_by_query
+        ]
+
+        document_ids = {ranked["document_id"] for ranked_documents in ranked_by_query for ranked in ranked_documents}
+        titles = {}
+        if get_documents_collection() is not None and document_ids:
+            titles = {
+                doc_data["_id"]: doc_data["title"]
+                for doc_data in get_documents_collection().find({"_id": {"$in": list(document_ids)}}, {"title": 1})
+            }
+
+        return [
+            QuerySearchResult(
+                query_text=query_text,
+                documents=[
+                    SearchDocumentResult(
+                        document_id=ranked["document_id"],
+                        document_title=titles.get(ranked["document_id"], f"Document {ranked['document_id']}"),
+                        score=ranked["score"],
+                        passages=[
+                            SearchPassage(
+                                page_number=hit.get("page_num"),
+                                paragraph=hit.get("paragraph"),
+                                text=hit["text"],
+                                relevance_score=hit["similarity_score"]
+                            )
+                            for hit in ranked["hits"]
+                        ]
+                    )
+                    for ranked in ranked_documents
+                ]
+            )
+            for query_text, ranked_documents in zip(queries, ranked_by_query)
+        ]
+
+    @staticmethod
+    def fallback_documents(
+        query_text: str,
+        filters: Optional[QueryFilters] = None,
+        keyword_searched: bool = False
+    ) -> Tuple[List[str], Dict[str, List[Dict[str, Any]]], Optional[str]]:
+        if QUERY_FALLBACK_LIMIT <= 0 or QUERY_FALLBACK == "none":
+            return [], {}, None
+
+        # Keyword matches are tried first unless a hybrid search already included them;
+        # they are still tried when that search failed outright.
+        if not keyword_searched:
+            hits = SearchService.reciprocal_rank_fusion([
+                LexicalIndexService.search(query_text, RETRIEVAL_CANDIDATES, filters)
+            ])
+            for hit in hits:
+                hit.setdefault("similarity_score", 0.0)
+            # These hits are unscored keyword matches, so the similarity threshold does not apply.
+            ranked_documents = SearchService.rank_documents(hits, min_similarity=0.0, max_documents=QUERY_FALLBACK_LIMIT)
+            if ranked_documents:
+                logger.info(f"Keyword search found {len(ranked_documents)} documents")
+                return (
+                    [ranked["document_id"] for ranked in ranked_documents],
+                    {ranked["document_id"]: ranked["hits"] for ranked in ranked_documents},
+                    "lexical"
+                )
+
+        if QUERY_FALLBACK != "recent" or get_documents_collection() is None:
+            return [], {}, None
+        try:
+            records = (
+                get_documents_collection().find({**SearchService.document_query(filters), "metadata.processed": True}, {"_id": 1})
+                .sort([("metadata.upload_date", pymongo.DESCENDING), ("_id", pymongo.DESCENDING)])
+                .limit(QUERY_FALLBACK_LIMIT)
+            )
+            document_ids = [str(doc["_id"]) for doc in records]
+            logger.info(f"Using the {len(document_ids)} most recent documents")
+            return document_ids, {}, "recent"
+        except Exception as db_error:
+            logger.error(f"Error getting documents: {str(db_error)}")
+            return [], {}, None
+
+    @staticmethod
+    def save_query(query: Query) -> None:
+        query_dict = query.model_dump(by_alias=True)
+        query_dict['_id'] = query.id
+        get_queries_collection().insert_one(query_dict)
+
+    @staticmethod
+    def answer_document(
+        doc_id: str,
+        query_text: str,
+        retrieved_passages: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None,
+        on_token: Optional[Callable[[str], None]] = None
+    ) -> Optional[DocumentResponse]:
+        try:
+            doc_data = get_documents_collection().find_one({"_id": doc_id}, {"pages": 0})
+            if not doc_data:
+                logger.warning(f"Document {doc_id} not found in MongoDB")
+                return None
+
+            document = Document(**doc_data)
+
+            context = QueryService.build_document_context(
+                document,
+                query_text,
+                retrieved_passages,
+                query_embedding
+            )
+
+            if OllamaService.is_available():
+                result = OllamaService.extract_answer_from_document(context, query_text, on_token=on_token)
+            else:
+                result = QueryService.preview_result(context)
+
+            return QueryService.build_document_response(doc_id, document, result)
+
+        except Exception as doc_error:
+            logger.error(f"Error processing document {doc_id}: {str(doc_error)}")
+            return QueryService.error_response(doc_id, f"Error processing document: {str(doc_error)}")
+
+    @staticmethod
+    def build_document_response(doc_id: str, document: Document, result: Dict[str, Any]) -> DocumentResponse:
+        citations = []
+        for citation in result.get("citations", []):
+            citations.append(DocumentCitation(
+                document_id=doc_id,
+                document_title=document.title,
+                page_number=citation.get("page_number"),
+                paragraph=citation.get("paragraph"),
+                sentence=citation.get("sentence"),
+                relevance_score=citation.get("relevance_score", 0.5)
+            ))
+
+        return DocumentResponse(
+            document_id=doc_id,
+            document_title=document.title,
+            extracted_answer=result.get("extracted_answer", "No answer extracted"),
+            citations=citations
+        )
+
+    @staticmethod
+    def preview_result(context: List[str]) -> Dict[str, Any]:
+        logger.warning("Ollama is not available. Using simple text extraction.")
+        document_text = "\n\n".join(context)
+        return {
+            "extracted_answer": f"Ollama is not available. Here's a preview of the document:\n\n{document_text[:500]}...",
+            "citations": []
+        }
+
+    @staticmethod
+    def error_response(doc_id: str, message: str) -> DocumentResponse:
+        return DocumentResponse(
+            document_id=doc_id,
+            document_title=f"Document {doc_id}",
+            extracted_answer=message,
+            citations=[]
+        )
+
+    @staticmethod
+    def answer_documents(
+        document_ids: List[str],
+        query_text: str,
+        passages_by_document: Dict[str, List[Dict[str, Any]]],
+        query_embedding: Optional[List[float]] = None
+    ) -> List[DocumentResponse]:
+        responses_by_rank = {}
+        for event in QueryService.iter_document_answers(document_ids, query_text, passages_by_document, query_embedding):
+            if event["event"] == "document_response":
+                responses_by_rank[event["rank"]] = event["response"]
+
+        # Keep the retrieval ranking no matter which document finished first.
+        return [
+            responses_by_rank[rank]
+            for rank in sorted(responses_by_rank)
+            if responses_by_rank[rank] is not None
+        ]
+
+    @staticmethod
+    def iter_document_answers(
+        document_ids: List[str],
+        query_text: str,
+        passages_by_document: Dict[str, List[Dict[str, Any]]],
+        query_embedding: Optional[List[float]] = None,
+        stream_tokens: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        if not document_ids:
+            return
+
+        events = queue.Queue()
+        deadline = time.monotonic() + QUERY_DOCUMENT_TIMEOUT
+        # Set once the caller has stopped waiting, on timeout or when the client goes away.
+        abandoned = threading.Event()
+
+        def run(rank: int, doc_id: str) -> None:
+            # Work still queued after the caller gave up would only add load to Ollama.
+            if abandoned.is_set() or time.monotonic() >= deadline:
+                return
+            on_token = None
+            if stream_tokens:
+                on_token = lambda token: events.put({"event": "token", "rank": rank, "document_id": doc_id, "token": token})
+            try:
+                response = QueryService.answer_document(
+                    doc_id,
+                    query_text,
+                    passages_by_document.get(doc_id, []),
+                    query_embedding,
+                    on_token
+                )
+            except Exception as doc_error:
+                logger.error(f"Error processing document {doc_id}: {str(doc_error)}")
+                response = QueryService.error_response(doc_id, f"Error processing document: {str(doc_error)}")
+            events.put({"event": "document_response", "rank": rank, "document_id": doc_id, "response": response})
+
+        executor = ThreadPoolExecutor(
+            max_workers=min(QUERY_MAX_CONCURRENCY, len(document_ids)),
+            thread_name_prefix="document-answer"
+        )
+        futures = [executor.submit(run, rank, doc_id) for rank, doc_id in enumerate(document_ids)]
+
+        pending = set(range(len(document_ids)))
+        try:
+            while pending:
+                try:
+                    event = events.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if event["event"] == "document_response":
+                    pending.discard(event["rank"])
+                yield event
+
+            for rank in sorted(pending):
+                futures[rank].cancel()
+                doc_id = document_ids[rank]
+                logger.error(f"Timed out answering query for document {doc_id}")
+                yield {
+                    "event": "document_response",
+                    "rank": rank,
+                    "document_id": doc_id,
+                    "response": QueryService.error_response(doc_id, "Error processing document: timed out waiting for an answer")
+                }
+        finally:
+            abandoned.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def select_passages(passages: List[Dict[str, Any]], token_budget: int) -> List[Dict[str, Any]]:
+        unique_passages = {}
+        for passage in passages:
+            key = passage.get("embedding_id") or (passage["page_num"], passage.get("chunk_index"))
+            if key not in unique_passages or passage["similarity_score"] > unique_passages[key]["similarity_score"]:
+                unique_passages[key] = passage
+
+        selected = []
+        used_tokens = 0
+        for passage in sorted(unique_passages.values(), key=lambda p: p["similarity_score"], reverse=True):
+            passage_tokens = PromptBudgetService.count_tokens(passage["text"])
+            # A budget of 0 leaves the limit to the prompt packing, which fills the model's context.
+            if selected and token_budget > 0 and used_tokens + passage_tokens > token_budget:
+                break
+            selected.append(passage)
+            used_tokens += passage_tokens
+        return selected
+
+    @staticmethod
+    def build_document_context(
+        document: Document,
+        query_text: str,
+        retrieved_passages: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None
+    ) -> List[str]:
+        if QUERY_CONTEXT_MODE == "passages":
+            passages = retrieved_passages + VectorService.search_document_passages(
+                query_text,
+                document.id,
+                top_k=PASSAGES_PER_DOCUMENT,
+                query_embedding=query_embedding
+            )
+            selected = QueryService.select_passages(passages, PASSAGE_TOKEN_BUDGET)
+            if selected:
+                logger.info(f"Using {len(selected)} retrieved passages as context for document {document.id}")
+                return QueryService.format_passages(selected)
+
+        pages = PageService.get_pages(document.id)
+        return [f"Page {page.page_num}:\n{page.text}" for page in pages]
+
+    @staticmethod
+    def format_passages(passages: List[Dict[str, Any]]) -> List[str]:
+        sections = []
+        for passage in passages:
+            header = f"Page {passage['page_num']}"
+            if passage.get("paragraph"):
+                header += f", paragraph {passage['paragraph']}"
+            sections.append(f"{header}:\n{passage['text']}")
+        return sections
+
     @staticmethod
     def get_query(query_id: str) -> Optional[Query]:
         try:
-            if queries_collection is None:
+            if get_queries_collection() is None:
                 logger.error(f"Cannot get query {query_id}: MongoDB connection not available")
                 return None
 
             logger.info(f"Attempting to retrieve query with ID: {query_id}")
 
-            query_data = queries_collection.find_one({"_id": query_id})
+            query_data = get_queries_collection().find_one({"_id": query_id})
 
             if not query_data:
                 logger.error(f"Query with ID {query_id} not found in MongoDB")
@@ -125,3 +426,138 @@ class QueryService:
         except Exception as e:
             logger.error(f"Error getting query {query_id}: {str(e)}", exc_info=True)
             return None
+
+    @staticmethod
+    async def acreate_query(query_create: QueryCreate) -> Query:
+        try:
+            query_id = str(uuid.uuid4())
+
+            # Embedding the query and searching Chroma are CPU-bound, so they run in a worker thread.
+            document_ids, passages_by_document, query_embedding, fallback = await asyncio.to_thread(
+                QueryService.retrieve_documents,
+                query_create.text,
+                query_create
+            )
+
+            document_responses = await QueryService.aanswer_documents(
+                document_ids,
+                query_create.text,
+                passages_by_document,
+                query_embedding
+            )
+
+            query = Query(
+                id=query_id,
+                text=query_create.text,
+                document_responses=document_responses,
+                themes=[],
+                partial=fallback is not None,
+                fallback=fallback
+            )
+
+            await QueryService.asave_query(query)
+
+            return query
+        except Exception as e:
+            logger.error(f"Error creating query: {str(e)}")
+            raise
+
+    @staticmethod
+    async def asave_query(query: Query) -> None:
+        if get_async_queries_collection() is None:
+            await asyncio.to_thread(QueryService.save_query, query)
+            return
+        query_dict = query.model_dump(by_alias=True)
+        query_dict['_id'] = query.id
+        await get_async_queries_collection().insert_one(query_dict)
+
+    @staticmethod
+    async def aanswer_document(
+        doc_id: str,
+        query_text: str,
+        retrieved_passages: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None,
+        ollama_available: bool = True
+    ) -> Optional[DocumentResponse]:
+        try:
+            if get_async_documents_collection() is not None:
+                doc_data = await get_async_documents_collection().find_one({"_id": doc_id}, {"pages": 0})
+            else:
+                doc_data = await asyncio.to_thread(get_documents_collection().find_one, {"_id": doc_id}, {"pages": 0})
+            if not doc_data:
+                logger.warning(f"Document {doc_id} not found in MongoDB")
+                return None
+
+            document = Document(**doc_data)
+
+            context = await asyncio.to_thread(
+                QueryService.build_document_context,
+                document,
+                query_text,
+                retrieved_passages,
+                query_embedding
+            )
+
+            if ollama_available:
+                result = await OllamaService.aextract_answer_from_document(context, query_text)
+            else:
+                result = QueryService.preview_result(context)
+
+            return QueryService.build_document_response(doc_id, document, result)
+
+        except Exception as doc_error:
+            logger.error(f"Error processing document {doc_id}: {str(doc_error)}")
+            return QueryService.error_response(doc_id, f"Error processing document: {str(doc_error)}")
+
+    @staticmethod
+    async def aanswer_documents(
+        document_ids: List[str],
+        query_text: str,
+        passages_by_document: Dict[str, List[Dict[str, Any]]],
+        query_embedding: Optional[List[float]] = None
+    ) -> List[DocumentResponse]:
+        if not document_ids:
+            return []
+
+        ollama_available = await asyncio.to_thread(OllamaService.is_available)
+        semaphore = asyncio.Semaphore(QUERY_MAX_CONCURRENCY)
+
+        async def run(doc_id: str) -> Optional[DocumentResponse]:
+            async with semaphore:
+                return await QueryService.aanswer_document(
+                    doc_id,
+                    query_text,
+                    passages_by_document.get(doc_id, []),
+                    query_embedding,
+                    ollama_available
+                )
+
+        tasks = [asyncio.ensure_future(run(doc_id)) for doc_id in document_ids]
+        _, pending = await asyncio.wait(tasks, timeout=QUERY_DOCUMENT_TIMEOUT)
+
+        responses = []
+        for doc_id, task in zip(document_ids, tasks):
+            if task in pending:
+                task.cancel()
+                logger.error(f"Timed out answering query for document {doc_id}")
+                responses.append(QueryService.error_response(doc_id, "Error processing document: timed out waiting for an answer"))
+            elif task.exception() is not None:
+                logger.error(f"Error processing document {doc_id}: {str(task.exception())}")
+                responses.append(QueryService.error_response(doc_id, f"Error processing document: {str(task.exception())}"))
+            elif task.result() is not None:
+                responses.append(task.result())
+        return responses
+
+    @staticmethod
+    async def aget_query(query_id: str) -> Optional[Query]:
+        if get_async_queries_collection() is None:
+            return await asyncio.to_thread(QueryService.get_query, query_id)
+        try:
+            query_data = await get_async_queries_collection().find_one({"_id": query_id})
+            if not query_data:
+                logger.error(f"Query with ID {query_id} not found in MongoDB")
+                return None
+            return Query(**query_data)
+        except Exception as e:
+            logger.error(f"Error getting query {query_id}: {str(e)}", exc_info=True)
+            return None
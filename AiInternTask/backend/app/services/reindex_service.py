@@ -0,0 +1,254 @@
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional
+from ..models.document import IndexStatusResponse
+from ..core.database import get_documents_collection, load_index_state, save_index_state, drop_chroma_collection
+from ..config import EMBEDDING_MODEL, EMBEDDING_INDEX_VERSION, REINDEX_BATCH_DOCUMENTS, REINDEX_LEASE_SECONDS
+from .chunking_service import ChunkingService
+from .page_service import PageService
+from .vector_service import VectorService
+
+logger = logging.getLogger(__name__)
+
+class ReindexService:
+    _lock = threading.Lock()
+    _thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def owner() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def is_running_here() -> bool:
+        return ReindexService._thread is not None and ReindexService._thread.is_alive()
+
+    @staticmethod
+    def _held_elsewhere(reindex: Optional[Dict[str, Any]]) -> bool:
+        if reindex is None or reindex["status"] != "running" or reindex.get("owner") == ReindexService.owner():
+            return False
+
+        host, _, pid = reindex.get("owner", "").rpartition(":")
+        if host == socket.gethostname() and os.name == "posix" and pid.isdigit():
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                return False
+            except PermissionError:
+                pass
+
+        # Workers on other hosts are trusted while they keep saving checkpoints.
+        updated_at = datetime.fromisoformat(reindex["updated_at"])
+        return (datetime.now(timezone.utc) - updated_at).total_seconds() < REINDEX_LEASE_SECONDS
+
+    @staticmethod
+    def new_job() -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        return {
+            "status": "running",
+            "target_collection": f"documents_{now:%Y%m%d%H%M%S}",
+            "embedding_model": EMBEDDING_MODEL,
+            "embedding_version": EMBEDDING_INDEX_VERSION,
+            "processed_documents": 0,
+            "total_documents": get_documents_collection().count_documents({}),
+            "skipped_documents": [],
+            "checkpoint": None,
+            "owner": ReindexService.owner(),
+            "started_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+            "finished_at": None,
+            "error": None
+        }
+
+    @staticmethod
+    def start() -> IndexStatusResponse:
+        if get_documents_collection() is None:
+            raise RuntimeError("Reindexing needs the MongoDB connection to read document pages")
+
+        with ReindexService._lock:
+            state = load_index_state()
+            reindex = state.get("reindex")
+            if ReindexService.is_running_here() or ReindexService._held_elsewhere(reindex):
+                return ReindexService.status()
+
+            resumable = (
+                reindex is not None
+                and reindex["status"] != "completed"
+                and reindex["embedding_model"] == EMBEDDING_MODEL
+                and reindex["embedding_version"] == EMBEDDING_INDEX_VERSION
+            )
+            if resumable:
+                if reindex["status"] == "failed" and reindex["checkpoint"]:
+                    # Uploads are only double-written while a job is running, so documents
+                    # added since it failed are re-embedded with the skipped ones before the swap.
+                    failed_at = datetime.fromisoformat(reindex["updated_at"])
+                    missed = get_documents_collection().find(
+                        {"_id": {"$lte": reindex["checkpoint"]}, "metadata.upload_date": {"$gte": failed_at}},
+                        {"_id": 1}
+                    )
+                    reindex["skipped_documents"] = list(dict.fromkeys(
+                        reindex["skipped_documents"] + [doc_data["_id"] for doc_data in missed]
+                    ))
+                now = datetime.now(timezone.utc).isoformat()
+                reindex.update(status="running", owner=ReindexService.owner(), updated_at=now, error=None)
+                logger.info(f"Resuming reindex into {reindex['target_collection']} after document {reindex['checkpoint']}")
+            else:
+                # A reindex for another model is abandoned, and the collection kept from the
+                # last swap is no longer needed for rollback.
+                if reindex is not None and reindex["status"] != "completed":
+                    drop_chroma_collection(reindex["target_collection"])
+                if state.get("previous_collection"):
+                    drop_chroma_collection(state["previous_collection"])
+                    state["previous_collection"] = None
+                reindex = ReindexService.new_job()
+                logger.info(f"Starting reindex of {reindex['total_documents']} documents into {reindex['target_collection']} with {EMBEDDING_MODEL}")
+
+            state["reindex"] = reindex
+            save_index_state(state)
+            ReindexService._thread = threading.Thread(
+                target=ReindexService.run,
+                args=(reindex["target_collection"],),
+                name="reindex",
+                daemon=True
+            )
+            ReindexService._thread.start()
+        return ReindexService.status()
+
+    @staticmethod
+    def resume() -> bool:
+        # Called at startup; picks up a reindex whose process stopped before the swap.
+        try:
+            reindex = load_index_state().get("reindex")
+            if reindex is None or reindex["status"] != "running" or ReindexService._held_elsewhere(reindex):
+                return False
+            ReindexService.start()
+            return True
+        except Exception as e:
+            logger.error(f"Error resuming reindex: {str(e)}")
+            return False
+
+    @staticmethod
+    def _update(target_collection: str, **fields: Any) -> bool:
+        with ReindexService._lock:
+            state = load_index_state()
+            reindex = state.get("reindex")
+            # Another process may have taken the job over; its checkpoints win.
+            if (
+                reindex is None
+                or reindex["target_collection"] != target_collection
+                or reindex.get("owner") != ReindexService.owner()
+            ):
+                return False
+            reindex.update(fields, updated_at=datetime.now(timezone.utc).isoformat())
+            save_index_state(state)
+            return True
+
+    @staticmethod
+    def reindex_documents(document_ids: List[str], index: Dict[str, str]) -> List[str]:
+        chunks_by_document = {}
+        skipped = []
+        for document_id in document_ids:
+            pages = PageService.get_pages(document_id)
+            if not pages:
+                skipped.append(document_id)
+                continue
+            chunks_by_document[document_id] = ChunkingService.chunk_pages(
+                [{"page_num": page.page_num, "text": page.text} for page in pages]
+            )
+        if chunks_by_document:
+            VectorService.create_embeddings_for_documents(
+                chunks_by_document,
+                indexes=[index],
+                document_metadata=VectorService.document_metadata_by_id(list(chunks_by_document))
+            )
+        return skipped
+
+    @staticmethod
+    def run(target_collection: str) -> None:
+        try:
+            reindex = load_index_state()["reindex"]
+            index = {
+                "collection": target_collection,
+                "embedding_model": reindex["embedding_model"],
+                "embedding_version": reindex["embedding_version"]
+            }
+            if not VectorService.get_embedding_model(index["embedding_model"]):
+                raise RuntimeError(f"Embedding model {index['embedding_model']} is not available")
+
+            checkpoint = reindex["checkpoint"]
+            processed = reindex["processed_documents"]
+            skipped = reindex["skipped_documents"]
+            while True:
+                query = {"_id": {"$gt": checkpoint}} if checkpoint else {}
+                document_ids = [
+                    doc_data["_id"]
+                    for doc_data in get_documents_collection().find(query, {"_id": 1}).sort("_id", 1).limit(REINDEX_BATCH_DOCUMENTS)
+                ]
+                if not document_ids:
+                    break
+
+                batch_skipped = ReindexService.reindex_documents(document_ids, index)
+                checkpoint = document_ids[-1]
+                processed += len(document_ids) - len(batch_skipped)
+                skipped = skipped + batch_skipped
+                if not ReindexService._update(
+                    target_collection,
+                    checkpoint=checkpoint,
+                    processed_documents=processed,
+                    skipped_documents=skipped
+                ):
+                    logger.info(f"Reindex into {target_collection} was taken over by another process")
+                    return
+
+            # Documents without pages were still being ingested when the job reached them.
+            if skipped:
+                still_skipped = ReindexService.reindex_documents(skipped, index)
+                processed += len(skipped) - len(still_skipped)
+                skipped = still_skipped
+                if skipped:
+                    logger.warning(f"Reindex skipped {len(skipped)} documents without stored pages")
+
+            ReindexService.swap(target_collection, processed, skipped)
+        except Exception as e:
+            logger.error(f"Error reindexing into {target_collection}: {str(e)}")
+            ReindexService._update(target_collection, status="failed", error=str(e))
+
+    @staticmethod
+    def swap(target_collection: str, processed: int, skipped: List[str]) -> None:
+        with ReindexService._lock:
+            state = load_index_state()
+            reindex = state["reindex"]
+            if reindex["target_collection"] != target_collection or reindex.get("owner") != ReindexService.owner():
+                return
+
+            now = datetime.now(timezone.utc).isoformat()
+            previous_collection = state["active_collection"]
+            # One state file write switches every worker to the new collection.
+            state.update(
+                active_collection=target_collection,
+                embedding_model=reindex["embedding_model"],
+                embedding_version=reindex["embedding_version"],
+                previous_collection=previous_collection
+            )
+            reindex.update(
+                status="completed",
+                processed_documents=processed,
+                skipped_documents=skipped,
+                updated_at=now,
+                finished_at=now
+            )
+            save_index_state(state)
+        logger.info(f"Swapped the live index from {previous_collection} to {target_collection}")
+
+    @staticmethod
+    def status() -> IndexStatusResponse:
+        state = load_index_state()
+        return IndexStatusResponse(
+            active_collection=state["active_collection"],
+            embedding_model=state["embedding_model"],
+            embedding_version=state["embedding_version"],
+            previous_collection=state.get("previous_collection"),
+            reindex=state.get("reindex")
+        )
@@ -0,0 +1,165 @@
+import logging
+from typing import List, Dict, Any, Optional
+from ..config import (
+    RETRIEVAL_MODE,
+    HYBRID_CANDIDATES,
+    HYBRID_RRF_K,
+    DOCUMENT_SCORE_AGGREGATION,
+    DOCUMENT_SCORE_TOP_N,
+    MIN_SIMILARITY,
+    MAX_QUERY_DOCUMENTS,
+    PASSAGES_PER_DOCUMENT,
+)
+from ..models.query import QueryFilters
+from .vector_service import VectorService
+from .lexical_service import LexicalIndexService
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_SCORE_AGGREGATIONS = ("max", "sum", "mean_top_n")
+
+class SearchService:
+
+    @staticmethod
+    def reciprocal_rank_fusion(result_lists: List[List[Dict[str, Any]]], k: int = HYBRID_RRF_K) -> List[Dict[str, Any]]:
+        fused = {}
+        for results in result_lists:
+            for rank, hit in enumerate(results):
+                key = hit["embedding_id"]
+                if key not in fused:
+                    fused[key] = {**hit, "fusion_score": 0.0}
+                else:
+                    # Keep the first list's fields (vector hits carry the similarity score).
+                    for field, value in hit.items():
+                        fused[key].setdefault(field, value)
+                fused[key]["fusion_score"] += 1.0 / (k + rank + 1)
+        return sorted(fused.values(), key=lambda hit: hit["fusion_score"], reverse=True)
+
+    @staticmethod
+    def document_query(filters: Optional[QueryFilters]) -> Dict[str, Any]:
+        query = {}
+        if filters is None:
+            return query
+        if filters.document_ids:
+            query["_id"] = {"$in": list(filters.document_ids)}
+        if filters.file_type:
+            query["file_type"] = filters.file_type.lower().lstrip(".")
+        date_range = {}
+        if filters.uploaded_after:
+            date_range["$gte"] = filters.uploaded_after
+        if filters.uploaded_before:
+            date_range["$lt"] = filters.uploaded_before
+        if date_range:
+            query["metadata.upload_date"] = date_range
+        return query
+
+    @staticmethod
+    def search(
+        query: str,
+        top_k: int = 10,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[QueryFilters] = None
+    ) -> List[Dict[str, Any]]:
+        query_embeddings = [query_embedding] if query_embedding is not None else None
+        return SearchService.search_many([query], top_k, query_embeddings, filters)[0]
+
+    @staticmethod
+    def search_many(
+        queries: List[str],
+        top_k: int = 10,
+        query_embeddings: Optional[List[List[float]]] = None,
+        filters: Optional[QueryFilters] = None
+    ) -> List[List[Dict[str, Any]]]:
+        if RETRIEVAL_MODE != "hybrid":
+            return VectorService.search_similar_documents_batch(queries, top_k, query_embeddings, filters)
+
+        candidates = max(top_k, HYBRID_CANDIDATES)
+        if query_embeddings is None:
+            query_embeddings = VectorService.embed_queries(queries)
+
+        # All queries go to Chroma in one call; the keyword index is searched per query.
+        vector_hits = VectorService.search_similar_documents_batch(queries, candidates, query_embeddings, filters)
+        return [
+            SearchService.fuse(query, query_vector_hits, top_k, query_embedding, filters)
+            for query, query_vector_hits, query_embedding in zip(queries, vector_hits, query_embeddings)
+        ]
+
+    @staticmethod
+    def fuse(
+        query: str,
+        vector_hits: List[Dict[str, Any]],
+        top_k: int,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[QueryFilters] = None
+    ) -> List[Dict[str, Any]]:
+        lexical_hits = LexicalIndexService.search(query, max(top_k, HYBRID_CANDIDATES), filters)
+        hits = SearchService.reciprocal_rank_fusion([vector_hits, lexical_hits])[:top_k]
+
+        # Exact-term matches that the vector search missed still get a real similarity score,
+        # so passage selection can rank them alongside the vector hits.
+        missing = [hit["embedding_id"] for hit in hits if "similarity_score" not in hit]
+        scores = {}
+        if missing and query_embedding is not None:
+            try:
+                scores = VectorService.similarity_scores(missing, query_embedding)
+            except Exception as e:
+                logger.warning(f"Could not score lexical matches: {str(e)}")
+        for hit in hits:
+            if "similarity_score" not in hit:
+                # Without a query embedding or a stored vector there is nothing to compare, so
+                # the hit is marked unscored and is not held to the similarity threshold.
+                hit["similarity_score"] = scores.get(hit["embedding_id"], 0.0)
+                hit["unscored"] = hit["embedding_id"] not in scores
+
+        logger.info(f"Hybrid search fused {len(vector_hits)} vector and {len(lexical_hits)} lexical hits into {len(hits)} results")
+        return hits
+
+    @staticmethod
+    def hit_score(hit: Dict[str, Any]) -> float:
+        # Fused hits are ranked by their fusion score, plain vector hits by similarity.
+        return hit.get("fusion_score", hit["similarity_score"])
+
+    @staticmethod
+    def aggregate_score(scores: List[float], aggregation: str, top_n: int) -> float:
+        if aggregation == "sum":
+            return sum(scores)
+        if aggregation == "mean_top_n":
+            top_scores = scores[:top_n]
+            return sum(top_scores) / len(top_scores)
+        return scores[0]
+
+    @staticmethod
+    def rank_documents(
+        hits: List[Dict[str, Any]],
+        aggregation: str = DOCUMENT_SCORE_AGGREGATION,
+        min_similarity: float = MIN_SIMILARITY,
+        max_documents: int = MAX_QUERY_DOCUMENTS,
+        hits_per_document: int = PASSAGES_PER_DOCUMENT,
+        top_n: int = DOCUMENT_SCORE_TOP_N
+    ) -> List[Dict[str, Any]]:
+        if aggregation not in DOCUMENT_SCORE_AGGREGATIONS:
+            raise ValueError(f"Unsupported document score aggregation: {aggregation}")
+
+        hits_by_document = {}
+        for hit in hits:
+            # Lexical-only hits scored during fusion face the same threshold. Exact identifier
+            # matches, which embeddings capture poorly, and hits that could not be scored skip it.
+            exempt = hit.get("identifier_match") or hit.get("unscored")
+            if hit["similarity_score"] < min_similarity and not exempt:
+                continue
+            hits_by_document.setdefault(hit["document_id"], []).append(hit)
+
+        ranked = []
+        for document_id, document_hits in hits_by_document.items():
+            document_hits.sort(key=SearchService.hit_score, reverse=True)
+            scores = [SearchService.hit_score(hit) for hit in document_hits]
+            ranked.append({
+                "document_id": document_id,
+                "score": SearchService.aggregate_score(scores, aggregation, top_n),
+                "hits": document_hits[:hits_per_document]
+            })
+
+        ranked.sort(key=lambda document: document["score"], reverse=True)
+        if len(ranked) > max_documents:
+            logger.info(f"Keeping the top {max_documents} of {len(ranked)} matching documents")
+        return ranked[:max_documents]
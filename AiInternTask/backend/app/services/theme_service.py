@@ -1,63 +1,112 @@
+import asyncio
 import logging
-from typing import List
+from typing import Any, Dict, List
 from ..models.query import Query, ThemeResponse
-from ..core.database import queries_collection
+from ..core.database import get_queries_collection, get_async_queries_collection
 from .ollama_service import OllamaService
 
 logger = logging.getLogger(__name__)
 
 class ThemeService:
     @staticmethod
-    def identify_themes(query: Query) -> List[ThemeResponse]:
-        if not OllamaService.is_available():
-            logger.warning("Ollama not available. Skipping theme identification.")
-            return [
-                ThemeResponse(
-                    theme_name="Theme Identification Unavailable",
-                    description="Theme identification is unavailable because Ollama is not running.",
-                    document_ids=[],
-                    supporting_evidence=["Please make sure Ollama is installed and running to enable theme identification."]
-                )
-            ]
-
-        try:
-            doc_responses = []
-            for response in query.document_responses:
-                doc_responses.append({
-                    "document_id": response.document_id,
-                    "document_title": response.document_title,
-                    "extracted_answer": response.extracted_answer
-                })
-
-            theme_results = OllamaService.identify_themes(doc_responses, query.text)
-
-            themes = []
-            for theme in theme_results:
-                themes.append(ThemeResponse(
-                    theme_name=theme.get("theme_name", "Unnamed Theme"),
-                    description=theme.get("description", "No description provided"),
-                    document_ids=theme.get("document_ids", []),
-                    supporting_evidence=theme.get("supporting_evidence", [])
-                ))
-
-            queries_collection.update_one(
-                {"_id": query.id},
-                {"$set": {"themes": [theme.model_dump() for theme in themes]}}
+    def unavailable_themes() -> List[ThemeResponse]:
+        logger.warning("Ollama not available. Skipping theme identification.")
+        return [
+            ThemeResponse(
+                theme_name="Theme Identification Unavailable",
+                description="Theme identification is unavailable because Ollama is not running.",
+                document_ids=[],
+                supporting_evidence=["Please make sure Ollama is installed and running to enable theme identification."]
             )
+        ]
 
-            return themes
-        except Exception as e:
-            logger.error(f"Error identifying themes: {str(e)}")
-            error_theme = ThemeResponse(
+    @staticmethod
+    def error_themes(error: Exception) -> List[ThemeResponse]:
+        logger.error(f"Error identifying themes: {str(error)}")
+        return [
+            ThemeResponse(
                 theme_name="Theme Identification Error",
-                description=f"An error occurred during theme identification: {str(e)}",
+                description=f"An error occurred during theme identification: {str(error)}",
                 document_ids=[],
                 supporting_evidence=["Please check your Ollama configuration."]
             )
+        ]
+
+    @staticmethod
+    def document_answers(query: Query) -> List[Dict[str, Any]]:
+        return [
+            {
+                "document_id": response.document_id,
+                "document_title": response.document_title,
+                "extracted_answer": response.extracted_answer
+            }
+            for response in query.document_responses
+        ]
+
+    @staticmethod
+    def parse_themes(theme_results: List[Dict[str, Any]]) -> List[ThemeResponse]:
+        return [
+            ThemeResponse(
+                theme_name=theme.get("theme_name", "Unnamed Theme"),
+                description=theme.get("description", "No description provided"),
+                document_ids=theme.get("document_ids", []),
+                supporting_evidence=theme.get("supporting_evidence", [])
+            )
+            for theme in theme_results
+        ]
+
+    # Both paths save whatever they return, including the unavailable and error
+    # themes, so a query read back later shows the same themes as its response.
+    @staticmethod
+    def identify_themes(query: Query) -> List[ThemeResponse]:
+        if not OllamaService.is_available():
+            themes = ThemeService.unavailable_themes()
+        else:
+            try:
+                theme_results = OllamaService.identify_themes(ThemeService.document_answers(query), query.text)
+                themes = ThemeService.parse_themes(theme_results)
+            except Exception as e:
+                themes = ThemeService.error_themes(e)
+
+        ThemeService.save_themes(query.id, themes)
+        return themes
+
+    @staticmethod
+    async def aidentify_themes(query: Query) -> List[ThemeResponse]:
+        # The availability check may probe Ollama over HTTP, so keep it off the event loop.
+        if not await asyncio.to_thread(OllamaService.is_available):
+            themes = ThemeService.unavailable_themes()
+        else:
+            try:
+                theme_results = await OllamaService.aidentify_themes(ThemeService.document_answers(query), query.text)
+                themes = ThemeService.parse_themes(theme_results)
+            except Exception as e:
+                themes = ThemeService.error_themes(e)
+
+        await ThemeService.asave_themes(query.id, themes)
+        return themes
 
-            queries_collection.update_one(
-                {"_id": query.id},
-                {"$set": {"themes": [error_theme.model_dump()]}}
+    @staticmethod
+    def save_themes(query_id: str, themes: List[ThemeResponse]) -> None:
+        if get_queries_collection() is None:
+            return
+        try:
+            get_queries_collection().update_one(
+                {"_id": query_id},
+                {"$set": {"themes": [theme.model_dump() for theme in themes]}}
             )
+        except Exception as e:
+            logger.error(f"Error saving themes for query {query_id}: {str(e)}")
 
-            return [error_theme]
+    @staticmethod
+    async def asave_themes(query_id: str, themes: List[ThemeResponse]) -> None:
+        if get_async_queries_collection() is None:
+            await asyncio.to_thread(ThemeService.save_themes, query_id, themes)
+            return
+        try:
+            await get_async_queries_collection().update_one(
+                {"_id": query_id},
+                {"$set": {"themes": [theme.model_dump() for theme in themes]}}
+            )
+        except Exception as e:
+            logger.error(f"Error saving themes for query {query_id}: {str(e)}")
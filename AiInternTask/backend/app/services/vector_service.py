@@ -1,159 +1,510 @@
+import hashlib
+import importlib.util
 import logging
 import os
-from typing import List, Dict, Any
-from ..core.database import document_collection
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from ..models.query import QueryFilters
+from ..core.database import get_chroma_collection, get_vector_collection, load_index_state
+from ..config import EMBEDDING_BATCH_SIZE, QUERY_EMBEDDING_CACHE_SIZE
+from .chunking_service import ChunkingService
 
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 logger = logging.getLogger(__name__)
 
-try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    HUGGINGFACE_AVAILABLE = True
-except ImportError:
-    HUGGINGFACE_AVAILABLE = False
+# Only check that the package is installed here; importing it pulls in sentence-transformers.
+HUGGINGFACE_AVAILABLE = importlib.util.find_spec("langchain_community") is not None
+if not HUGGINGFACE_AVAILABLE:
     logger.warning("HuggingFace embeddings not available. Vector search will be limited.")
 
+WHITESPACE = re.compile(r"\s+")
+
 class VectorService:
-    embedding_model = None
-    if HUGGINGFACE_AVAILABLE:
+    _embedding_models: Dict[str, Any] = {}
+    _model_states: Dict[str, str] = {}
+    _model_lock = threading.Lock()
+    _query_embeddings: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+    _query_cache_lock = threading.Lock()
+
+    @staticmethod
+    def active_index() -> Dict[str, str]:
+        state = load_index_state()
+        return {
+            "collection": state["active_collection"],
+            "embedding_model": state["embedding_model"],
+            "embedding_version": state["embedding_version"]
+        }
+
+    @staticmethod
+    def write_indexes() -> List[Dict[str, str]]:
+        # While a reindex runs, new vectors also go to its collection, so documents
+        # uploaded in the meantime are not missing after the swap.
+        state = load_index_state()
+        indexes = [VectorService.active_index()]
+        reindex = state.get("reindex")
+        if reindex and reindex["status"] == "running":
+            indexes.append({
+                "collection": reindex["target_collection"],
+                "embedding_model": reindex["embedding_model"],
+                "embedding_version": reindex["embedding_version"]
+            })
+        return indexes
+
+    @staticmethod
+    def get_embedding_model(model_name: Optional[str] = None):
+        if not HUGGINGFACE_AVAILABLE:
+            return None
+        # Queries are embedded with the model the live index was built with.
+        model_name = model_name or VectorService.active_index()["embedding_model"]
+        model = VectorService._embedding_models.get(model_name)
+        if model is not None or VectorService._model_states.get(model_name) == "failed":
+            return model
+
+        with VectorService._model_lock:
+            if VectorService._model_states.get(model_name, "not loaded") == "not loaded":
+                VectorService._model_states[model_name] = "loading"
+                started = time.monotonic()
+                try:
+                    from langchain_community.embeddings import HuggingFaceEmbeddings
+                    VectorService._embedding_models[model_name] = HuggingFaceEmbeddings(
+                        model_name=model_name,
+                        model_kwargs={"device": "cpu"},
+                        encode_kwargs={"normalize_embeddings": True}
+                    )
+                    VectorService._model_states[model_name] = "loaded"
+                    logger.info(f"Loaded embedding model {model_name} in {time.monotonic() - started:.1f}s")
+                except Exception as e:
+                    VectorService._model_states[model_name] = "failed"
+                    logger.error(f"Error initializing HuggingFaceEmbeddings: {str(e)}")
+        return VectorService._embedding_models.get(model_name)
+
+    @staticmethod
+    def model_state(model_name: Optional[str] = None) -> str:
+        if not HUGGINGFACE_AVAILABLE:
+            return "unavailable"
+        model_name = model_name or VectorService.active_index()["embedding_model"]
+        return VectorService._model_states.get(model_name, "not loaded")
+
+    @staticmethod
+    def warm_up() -> bool:
+        model = VectorService.get_embedding_model()
+        if not model:
+            return False
         try:
-            embedding_model = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
-                model_kwargs={"device": "cpu"},
-                encode_kwargs={"normalize_embeddings": True}
-            )
+            # The first forward pass allocates buffers; run it before real traffic arrives.
+            model.embed_query("warm up")
+            return True
         except Exception as e:
-            logger.error(f"Error initializing HuggingFaceEmbeddings: {str(e)}")
+            logger.error(f"Error warming up embedding model: {str(e)}")
+            return False
 
     @staticmethod
-    def create_embedding(document_id: str, page_num: int, text: str) -> str:
-        embedding_id = f"{document_id}_page_{page_num}"
+    def page_embedding_id(document_id: str, page_num: int) -> str:
+        return f"{document_id}_page_{page_num}"
 
-        if not VectorService.embedding_model:
-            logger.warning("Embedding model not available. Skipping vector embedding creation.")
-            return embedding_id
+    @staticmethod
+    def chunk_embedding_id(document_id: str, chunk: Dict[str, Any]) -> str:
+        embedding_id = VectorService.page_embedding_id(document_id, chunk["page_num"])
+        if "chunk_index" in chunk:
+            embedding_id = f"{embedding_id}_chunk_{chunk['chunk_index']}"
+        return embedding_id
 
+    @staticmethod
+    def embedding_ids_by_page(embedding_ids: List[str], chunks: List[Dict[str, Any]]) -> Dict[int, List[str]]:
+        by_page = {}
+        for embedding_id, chunk in zip(embedding_ids, chunks):
+            by_page.setdefault(chunk["page_num"], []).append(embedding_id)
+        return by_page
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @staticmethod
+    def find_cached_embeddings(text_hashes: List[str], collection=None) -> Dict[str, List[float]]:
+        collection = collection if collection is not None else get_vector_collection()
         try:
-            embeddings = VectorService.embedding_model.embed_documents([text])
-            if not embeddings:
-                raise ValueError("Embedding failed or returned empty result.")
-            embedding = embeddings[0]
-
-            doc_id_str = str(document_id)
-
-            document_collection.add(
-                ids=[embedding_id],
-                embeddings=[embedding],
-                metadatas=[{
-                    "document_id": doc_id_str,
-                    "page_num": page_num
-                }],
-                documents=[text]
+            results = collection.get(
+                where={"text_hash": {"$in": list(set(text_hashes))}},
+                include=["embeddings", "metadatas"]
             )
-            return embedding_id
         except Exception as e:
-            logger.error(f"Error creating embedding: {str(e)}")
-            return embedding_id
+            logger.warning(f"Could not look up cached embeddings: {str(e)}")
+            return {}
+
+        cached = {}
+        embeddings = results.get("embeddings")
+        if embeddings is None:
+            return cached
+        for metadata, embedding in zip(results["metadatas"], embeddings):
+            text_hash = metadata.get("text_hash")
+            if text_hash and text_hash not in cached:
+                cached[text_hash] = [float(value) for value in embedding]
+        return cached
 
     @staticmethod
-    def search_similar_documents(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        if not VectorService.embedding_model:
-            logger.warning("Embedding model not available. Returning empty search results.")
-            return []
+    def embed_texts(
+        texts: List[str],
+        text_hashes: List[str],
+        index: Optional[Dict[str, str]] = None
+    ) -> List[List[float]]:
+        index = index or VectorService.active_index()
+        # Identical chunks (cover pages, boilerplate, re-uploads) reuse the vector
+        # already stored for that text instead of running the model again. Each
+        # collection holds vectors from a single model, so the lookup stays within it.
+        cached = VectorService.find_cached_embeddings(text_hashes, get_chroma_collection(index["collection"]))
 
-        try:
-            collection_count = document_collection.count()
-            if collection_count == 0:
-                logger.warning("ChromaDB collection is empty. No embeddings to search.")
-                return []
+        missing_texts = {}
+        for text, text_hash in zip(texts, text_hashes):
+            if text_hash not in cached:
+                missing_texts[text_hash] = text
 
-            query_embedding = VectorService.embedding_model.embed_query(query)
+        if missing_texts:
+            model = VectorService.get_embedding_model(index["embedding_model"])
+            new_embeddings = model.embed_documents(list(missing_texts.values()))
+            if not new_embeddings or len(new_embeddings) != len(missing_texts):
+                raise ValueError("Embedding failed or returned an incomplete result.")
+            cached.update(zip(missing_texts.keys(), new_embeddings))
 
-            actual_top_k = min(top_k, collection_count)
-            if actual_top_k < top_k:
-                logger.info(f"Limiting search results to {actual_top_k} (collection size) instead of requested {top_k}")
+        if len(missing_texts) < len(texts):
+            logger.info(f"Reused cached embeddings for {len(texts) - len(missing_texts)} of {len(texts)} chunks")
+        return [cached[text_hash] for text_hash in text_hashes]
 
-            results = document_collection.query(
-                query_embeddings=[query_embedding],
-                n_results=actual_top_k,
-                include=["metadatas", "documents", "distances"]
-            )
+    @staticmethod
+    def timestamp(value: datetime) -> float:
+        # MongoDB returns naive datetimes that are already in UTC.
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
 
-            formatted_results = []
-            if results["ids"] and len(results["ids"][0]) > 0:
-                for i in range(len(results["ids"][0])):
-                    metadata = results["metadatas"][0][i] if i < len(results["metadatas"][0]) else {}
-                    document_id = metadata.get("document_id", "unknown")
-                    page_num = metadata.get("page_num", 1)
+    @staticmethod
+    def document_metadata(file_type: str, upload_date: datetime) -> Dict[str, Any]:
+        # Chroma range filters only compare numbers, so the upload date is stored as a timestamp.
+        return {"file_type": file_type, "upload_timestamp": VectorService.timestamp(upload_date)}
 
-                    text = results["documents"][0][i] if i < len(results["documents"][0]) else ""
+    @staticmethod
+    def document_metadata_by_id(document_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        from ..core.database import get_documents_collection
+        if get_documents_collection() is None or not document_ids:
+            return {}
+        records = get_documents_collection().find(
+            {"_id": {"$in": list(document_ids)}},
+            {"file_type": 1, "metadata.upload_date": 1}
+        )
+        return {
+            doc_data["_id"]: VectorService.document_metadata(doc_data["file_type"], doc_data["metadata"]["upload_date"])
+            for doc_data in records
+        }
 
-                    distance = results["distances"][0][i] if i < len(results["distances"][0]) else 1.0
-                    similarity_score = 1.0 - distance
+    @staticmethod
+    def build_where(filters: Optional[QueryFilters]) -> Optional[Dict[str, Any]]:
+        if filters is None:
+            return None
 
-                    formatted_results.append({
-                        "document_id": document_id,
-                        "page_num": page_num,
-                        "text": text,
-                        "similarity_score": similarity_score
-                    })
+        conditions = []
+        if filters.document_ids:
+            conditions.append({"document_id": {"$in": [str(document_id) for document_id in filters.document_ids]}})
+        if filters.file_type:
+            conditions.append({"file_type": filters.file_type.lower().lstrip(".")})
+        if filters.uploaded_after:
+            conditions.append({"upload_timestamp": {"$gte": VectorService.timestamp(filters.uploaded_after)}})
+        if filters.uploaded_before:
+            conditions.append({"upload_timestamp": {"$lt": VectorService.timestamp(filters.uploaded_before)}})
 
-                logger.info(f"Found {len(formatted_results)} similar documents")
-            else:
-                logger.warning("No similar documents found in vector search")
+        if not conditions:
+            return None
+        return conditions[0] if len(conditions) == 1 else {"$and": conditions}
 
+    @staticmethod
+    def create_embeddings(
+        document_id: str,
+        chunks: List[Dict[str, Any]],
+        batch_size: Optional[int] = None,
+        document_metadata: Optional[Dict[str, Any]] = None
+    ) -> List[str]:
+        metadata_by_document = {document_id: document_metadata} if document_metadata else None
+        return VectorService.create_embeddings_for_documents(
+            {document_id: chunks},
+            batch_size,
+            document_metadata=metadata_by_document
+        )[document_id]
+
+    @staticmethod
+    def create_embeddings_for_documents(
+        chunks_by_document: Dict[str, List[Dict[str, Any]]],
+        batch_size: Optional[int] = None,
+        indexes: Optional[List[Dict[str, str]]] = None,
+        document_metadata: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, List[str]]:
+        embedding_ids = {
+            document_id: [VectorService.chunk_embedding_id(document_id, chunk) for chunk in chunks]
+            for document_id, chunks in chunks_by_document.items()
+        }
+
+        # Chunks from several documents share each model forward pass and Chroma upsert.
+        items = [
+            (str(document_id), embedding_id, chunk)
+            for document_id, chunks in chunks_by_document.items()
+            for embedding_id, chunk in zip(embedding_ids[document_id], chunks)
+        ]
+        document_metadata = document_metadata or {}
+
+        batch_size = batch_size or EMBEDDING_BATCH_SIZE
+        for index in indexes or VectorService.write_indexes():
+            if not VectorService.get_embedding_model(index["embedding_model"]):
+                logger.warning(f"Embedding model {index['embedding_model']} not available. Skipping vector embedding creation for {index['collection']}.")
+                continue
+
+            collection = get_chroma_collection(index["collection"])
+            for start in range(0, len(items), batch_size):
+                batch = items[start:start + batch_size]
+                texts = [chunk["text"] for _, _, chunk in batch]
+                text_hashes = [VectorService.text_hash(text) for text in texts]
+                try:
+                    embeddings = VectorService.embed_texts(texts, text_hashes, index)
+
+                    metadatas = []
+                    for (doc_id_str, _, chunk), text_hash in zip(batch, text_hashes):
+                        metadata = {key: value for key, value in chunk.items() if key != "text"}
+                        # File type and upload date let searches filter inside Chroma.
+                        metadata.update(document_metadata.get(doc_id_str, {}))
+                        metadata["document_id"] = doc_id_str
+                        metadata["text_hash"] = text_hash
+                        metadata["embedding_model"] = index["embedding_model"]
+                        metadata["embedding_version"] = index["embedding_version"]
+                        metadatas.append(metadata)
+
+                    collection.upsert(
+                        ids=[embedding_id for _, embedding_id, _ in batch],
+                        embeddings=embeddings,
+                        metadatas=metadatas,
+                        documents=texts
+                    )
+                except Exception as e:
+                    batch_documents = sorted({doc_id_str for doc_id_str, _, _ in batch})
+                    logger.error(f"Error creating embeddings for items {start + 1}-{start + len(batch)} of documents {', '.join(batch_documents)}: {str(e)}")
+
+            logger.info(f"Embedded {len(items)} chunks for {len(chunks_by_document)} documents into {index['collection']} in batches of {batch_size}")
+        return embedding_ids
+
+    @staticmethod
+    def format_search_results(results: Dict[str, Any], index: int = 0) -> List[Dict[str, Any]]:
+        formatted_results = []
+        if not results["ids"] or len(results["ids"][index]) == 0:
             return formatted_results
+
+        for i in range(len(results["ids"][index])):
+            metadata = results["metadatas"][index][i] if i < len(results["metadatas"][index]) else {}
+            document_id = metadata.get("document_id", "unknown")
+            page_num = metadata.get("page_num", 1)
+
+            text = results["documents"][index][i] if i < len(results["documents"][index]) else ""
+
+            distance = results["distances"][index][i] if i < len(results["distances"][index]) else 1.0
+            similarity_score = 1.0 - distance
+
+            formatted_results.append({
+                "embedding_id": results["ids"][index][i],
+                "document_id": document_id,
+                "page_num": page_num,
+                "chunk_index": metadata.get("chunk_index"),
+                "paragraph": metadata.get("paragraph_start"),
+                "text": text,
+                "similarity_score": similarity_score
+            })
+        return formatted_results
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        # Case is kept because cased embedding models give "US" and "us" different vectors.
+        return WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query)).strip()
+
+    @staticmethod
+    def embed_queries(queries: List[str]) -> List[Optional[List[float]]]:
+        model_name = VectorService.active_index()["embedding_model"]
+        model = VectorService.get_embedding_model(model_name)
+        if not model:
+            return [None] * len(queries)
+
+        # Keyed by model as well, so a reindex swap never reuses vectors from the old model.
+        keys = [(model_name, VectorService.normalize_query(query)) for query in queries]
+        embeddings = {}
+        with VectorService._query_cache_lock:
+            for key in keys:
+                if key in VectorService._query_embeddings:
+                    VectorService._query_embeddings.move_to_end(key)
+                    embeddings[key] = VectorService._query_embeddings[key]
+
+        missing = list(dict.fromkeys(key for key in keys if key not in embeddings))
+        if missing:
+            # Every query not seen recently shares one forward pass.
+            new_embeddings = model.embed_documents([text for _, text in missing])
+            if not new_embeddings or len(new_embeddings) != len(missing):
+                raise ValueError("Embedding failed or returned an incomplete result.")
+            embeddings.update(zip(missing, new_embeddings))
+
+            if QUERY_EMBEDDING_CACHE_SIZE > 0:
+                with VectorService._query_cache_lock:
+                    for key in missing:
+                        VectorService._query_embeddings[key] = embeddings[key]
+                    while len(VectorService._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+                        VectorService._query_embeddings.popitem(last=False)
+
+        return [embeddings[key] for key in keys]
+
+    @staticmethod
+    def embed_query(query: str) -> Optional[List[float]]:
+        return VectorService.embed_queries([query])[0]
+
+    @staticmethod
+    def search_similar_documents(
+        query: str,
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None,
+        filters: Optional[QueryFilters] = None
+    ) -> List[Dict[str, Any]]:
+        query_embeddings = [query_embedding] if query_embedding is not None else None
+        formatted_results = VectorService.search_similar_documents_batch([query], top_k, query_embeddings, filters)[0]
+        if formatted_results:
+            logger.info(f"Found {len(formatted_results)} similar documents")
+        else:
+            logger.warning("No similar documents found in vector search")
+        return formatted_results
+
+    @staticmethod
+    def search_similar_documents_batch(
+        queries: List[str],
+        top_k: int = 5,
+        query_embeddings: Optional[List[List[float]]] = None,
+        filters: Optional[QueryFilters] = None
+    ) -> List[List[Dict[str, Any]]]:
+        if not VectorService.get_embedding_model():
+            logger.warning("Embedding model not available. Returning empty search results.")
+            return [[] for _ in queries]
+        if not queries:
+            return []
+
+        try:
+            if query_embeddings is None:
+                query_embeddings = VectorService.embed_queries(queries)
+
+            # Chroma caps n_results at the collection size and returns no hits for an
+            # empty collection, so there is no need to count it before every search.
+            # Filters run inside Chroma, so top_k is taken from the matching vectors only.
+            results = get_vector_collection().query(
+                query_embeddings=query_embeddings,
+                n_results=top_k,
+                where=VectorService.build_where(filters),
+                include=["metadatas", "documents", "distances"]
+            )
+            return [VectorService.format_search_results(results, index) for index in range(len(queries))]
         except Exception as e:
             logger.error(f"Error searching similar documents: {str(e)}")
+            return [[] for _ in queries]
+
+    @staticmethod
+    def similarity_scores(embedding_ids: List[str], query_embedding: List[float]) -> Dict[str, float]:
+        if not embedding_ids:
+            return {}
+        results = get_vector_collection().get(ids=list(embedding_ids), include=["embeddings"])
+        embeddings = results.get("embeddings")
+        if embeddings is None:
+            return {}
+        # Stored vectors are normalized, so the dot product is the cosine similarity.
+        return {
+            embedding_id: float(sum(a * b for a, b in zip(embedding, query_embedding)))
+            for embedding_id, embedding in zip(results["ids"], embeddings)
+        }
+
+    @staticmethod
+    def search_document_passages(
+        query: str,
+        document_id: str,
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Dict[str, Any]]:
+        if not VectorService.get_embedding_model():
+            logger.warning("Embedding model not available. Returning empty passage results.")
+            return []
+
+        try:
+            if query_embedding is None:
+                query_embedding = VectorService.embed_query(query)
+
+            results = get_vector_collection().query(
+                query_embeddings=[query_embedding],
+                n_results=top_k,
+                where={"document_id": str(document_id)},
+                include=["metadatas", "documents", "distances"]
+            )
+            return VectorService.format_search_results(results)
+        except Exception as e:
+            logger.error(f"Error searching passages for document {document_id}: {str(e)}")
             return []
 
     @staticmethod
     def rebuild_embeddings_for_document(document_id: str) -> bool:
-        if not VectorService.embedding_model:
+        if not VectorService.get_embedding_model():
             logger.warning("Embedding model not available. Cannot rebuild embeddings.")
             return False
 
         try:
-            from ..core.database import documents_collection
+            from ..core.database import get_documents_collection
 
-            if documents_collection is None:
+            if get_documents_collection() is None:
                 logger.warning("MongoDB documents collection is not initialized")
                 logger.info("Cannot rebuild embeddings without MongoDB connection")
                 return False
 
-            doc_data = documents_collection.find_one({"_id": document_id})
+            doc_data = get_documents_collection().find_one({"_id": document_id}, {"file_type": 1, "metadata.upload_date": 1})
             if not doc_data:
                 logger.warning(f"Document {document_id} not found in MongoDB")
                 return False
 
-            try:
-                results = document_collection.get(
-                    where={"document_id": str(document_id)}
-                )
-
-                if results and results["ids"]:
-                    document_collection.delete(
-                        ids=results["ids"]
+            for index in VectorService.write_indexes():
+                try:
+                    collection = get_chroma_collection(index["collection"])
+                    results = collection.get(
+                        where={"document_id": str(document_id)}
                     )
-                    logger.info(f"Deleted {len(results['ids'])} existing embeddings for document {document_id}")
+
+                    if results and results["ids"]:
+                        collection.delete(
+                            ids=results["ids"]
+                        )
+                        logger.info(f"Deleted {len(results['ids'])} existing embeddings for document {document_id} from {index['collection']}")
+                except Exception as e:
+                    logger.error(f"Error deleting existing embeddings: {str(e)}")
+            # Keyword hits for the deleted embeddings would otherwise outlive a failed rebuild.
+            from .lexical_service import LexicalIndexService
+            try:
+                LexicalIndexService.delete_document(document_id)
             except Exception as e:
-                logger.error(f"Error deleting existing embeddings: {str(e)}")
-            from ..models.document import Document
-            document = Document(**doc_data)
-
-            for page in document.pages:
-                embedding_id = VectorService.create_embedding(
-                    document_id=document_id,
-                    page_num=page.page_num,
-                    text=page.text
-                )
-                page.embedding_id = embedding_id
-
-            documents_collection.update_one(
-                {"_id": document_id},
-                {"$set": {"pages": [page.model_dump() for page in document.pages]}}
+                logger.error(f"Error deleting existing lexical index entries: {str(e)}")
+            from .page_service import PageService
+            pages = PageService.get_pages(document_id)
+
+            chunks = ChunkingService.chunk_pages(
+                [{"page_num": page.page_num, "text": page.text} for page in pages]
+            )
+            document_metadata = VectorService.document_metadata(doc_data["file_type"], doc_data["metadata"]["upload_date"])
+            embedding_ids = VectorService.create_embeddings(
+                document_id=document_id,
+                chunks=chunks,
+                document_metadata=document_metadata
             )
+            try:
+                LexicalIndexService.index_chunks(document_id, chunks, document_metadata=document_metadata)
+            except Exception as e:
+                logger.error(f"Error updating lexical index: {str(e)}")
+            ids_by_page = VectorService.embedding_ids_by_page(embedding_ids, chunks)
+            PageService.set_embedding_ids(document_id, {page.page_num: ids_by_page.get(page.page_num, []) for page in pages})
 
             logger.info(f"Successfully rebuilt embeddings for document {document_id}")
             return True